@@ -4,15 +4,21 @@ attack_learner.py — LLM Guardian Auto-Learning Engine
 Novel features:
   1. Auto-variant expansion  — 1 approved attack → ~15 variants auto-added to ChromaDB
   2. Novelty scoring         — how "new" is this attack vs the known cluster?
-  3. Probe detection         — 3+ blocked prompts in one session = adversarial flag
+  3. Probe detection         — 3+ blocked prompts per session per minute = adversarial flag
 """
 
 import os
 import re
 import json
 import random
+import threading
 from datetime import datetime
 
+from probe_tracker import ProbeTracker
+from candidate_store import CandidateStore
+from corpus_io import PhraseIndex, append_phrases, bulk_import, iter_export, export_to
+from hot_reload import owned_writes
+
 LEARNED_FILE = "learned_attacks.txt"
 
 # ── Synonym table for auto-variant generation ─────────────────────────────────
@@ -57,34 +63,44 @@ class AttackLearner:
     and learned_attacks.txt for cross-session persistence.
     """
 
-    def __init__(self, phase2_engine):
+    def __init__(self, phase2_engine, probe_tracker: ProbeTracker = None,
+                 max_candidates: int = 5000, spill_path: str = None):
         """
         Args:
             phase2_engine: live Phase2Semantic instance — variants are added
                            to its ChromaDB collection immediately on approval.
+            probe_tracker: per-session sliding-window tracker; a default
+                           one (3 blocks / 60 s) is created if omitted.
+            max_candidates: hard cap on the pending-review queue.
+            spill_path:    optional JSONL file for candidates evicted from
+                           a full queue (e.g. candidate_store.SPILL_FILE).
         """
         self.phase2 = phase2_engine
-        self._candidates: list[dict] = []   # pending human review
+        self._candidates = CandidateStore(max_candidates, spill_path)   # pending human review
         self._learned:    list[dict] = []   # approved + stored
-        self._probe_count: int = 0          # session-level BLOCK counter
+        self._learned_prompts: set[str] = set()
+        self.probes = probe_tracker or ProbeTracker()
+        self._phrase_index = None             # corpus_io.PhraseIndex, opened on first write
+        self._write_lock = threading.Lock()
 
     # ──────────────────────────────────────────────────────────────────────────
     # 1. Probing detection
     # ──────────────────────────────────────────────────────────────────────────
 
-    def record_block(self, prompt: str, risk_score: float) -> bool:
+    def record_block(self, prompt: str, risk_score: float,
+                     session_id: str = None, verdict: str = "BLOCK") -> bool:
         """
-        Call this every time a BLOCK verdict is issued.
-        Returns True if adversarial probing is detected (≥3 blocks this session).
+        Call this every time a BLOCK (or REVIEW) verdict is issued.
+        Returns True if adversarial probing is detected for this session
+        (≥3 weighted blocks inside the tracker's sliding window).
         """
-        self._probe_count += 1
-        return self._probe_count >= 3
+        return self.probes.record(session_id, verdict)["probing"]
 
-    def is_probing(self) -> bool:
-        return self._probe_count >= 3
+    def is_probing(self, session_id: str = None) -> bool:
+        return self.probes.is_probing(session_id)
 
-    def probe_count(self) -> int:
-        return self._probe_count
+    def probe_count(self, session_id: str = None) -> int:
+        return self.probes.status(session_id)["weighted"]
 
     # ──────────────────────────────────────────────────────────────────────────
     # 2. Candidate management
@@ -94,21 +110,13 @@ class AttackLearner:
                       novelty_score: float = 0.0):
         """Queue a blocked prompt for review. Deduplicates automatically."""
         prompt = prompt.strip()
-        if not prompt:
-            return
-        already = {c["prompt"] for c in self._candidates} | \
-                  {l["prompt"] for l in self._learned}
-        if prompt in already:
+        if not prompt or prompt in self._learned_prompts or self.phase2.has_attack(prompt):
             return
-        self._candidates.append({
-            "prompt":       prompt,
-            "risk_score":   round(risk_score, 3),
-            "novelty_score": round(novelty_score, 3),
-            "timestamp":    datetime.now().strftime("%H:%M:%S"),
-        })
+        self._candidates.add(prompt, risk_score, novelty_score)
 
-    def get_candidates(self) -> list[dict]:
-        return list(self._candidates)
+    def get_candidates(self, n: int = None) -> list[dict]:
+        """Pending candidates, most interesting (novel + risky) first."""
+        return self._candidates.top(n)
 
     def get_learned(self) -> list[dict]:
         return list(self._learned)
@@ -166,7 +174,7 @@ class AttackLearner:
         """
         prompt = prompt.strip()
         # Remove from candidates
-        self._candidates = [c for c in self._candidates if c["prompt"] != prompt]
+        self._candidates.remove(prompt)
 
         # Generate variants
         variants = self._generate_variants(prompt)
@@ -175,10 +183,13 @@ class AttackLearner:
         # Hot-add to ChromaDB
         self.phase2.add_attacks(all_new)
 
-        # Write original to learned_attacks.txt (for next-session reload)
-        self._append_to_file(prompt)
+        # Write original to learned_attacks.txt (for next-session reload);
+        # already live, so a hot-reload watcher needn't re-read the file
+        with owned_writes(LEARNED_FILE):
+            self._append_to_file(prompt)
 
         # Track
+        self._learned_prompts.add(prompt)
         self._learned.append({
             "prompt":          prompt,
             "variants_added":  len(variants),
@@ -190,16 +201,27 @@ class AttackLearner:
 
     def reject(self, prompt: str):
         """Silently discard a candidate."""
-        self._candidates = [c for c in self._candidates if c["prompt"] != prompt]
+        self._candidates.remove(prompt.strip())
 
     # ──────────────────────────────────────────────────────────────────────────
     # 5. Persistence helpers
     # ──────────────────────────────────────────────────────────────────────────
 
+    def _index(self) -> PhraseIndex:
+        if self._phrase_index is None:
+            self._phrase_index = PhraseIndex(learned_file=LEARNED_FILE)
+        return self._phrase_index
+
     def _append_to_file(self, phrase: str):
-        """Append a single approved phrase to learned_attacks.txt."""
-        with open(LEARNED_FILE, "a", encoding="utf-8") as f:
-            f.write(phrase + "\n")
+        """Append a single approved phrase to learned_attacks.txt (via the dedupe index)."""
+        with self._write_lock:
+            append_phrases([phrase], LEARNED_FILE, self._index())
+
+    def _record_imported(self, phrases: list[str]):
+        timestamp = datetime.now().strftime("%H:%M:%S")
+        for phrase in phrases:
+            self._learned_prompts.add(phrase)
+            self._learned.append({"prompt": phrase, "variants_added": 0, "timestamp": timestamp})
 
     def export_learned(self) -> str:
         """Return all learned entries as plain text (for download/commit)."""
@@ -208,30 +230,32 @@ class AttackLearner:
         with open(LEARNED_FILE, "r", encoding="utf-8") as f:
             return f.read()
 
+    def iter_learned(self, batch_size: int = 10_000):
+        """Stream the learned corpus in batches (export_learned for large files)."""
+        return iter_export(LEARNED_FILE, batch_size)
+
+    def export_to(self, path: str) -> int:
+        """Stream the learned corpus to a .txt or .jsonl file."""
+        return export_to(path, LEARNED_FILE)
+
+    def import_file(self, source, **kwargs) -> dict:
+        """
+        Stream a phrase file (path or iterable of lines) of any size into
+        learned_attacks.txt and the live index — deduped via a persistent
+        hash index, encoded and written in batches. See corpus_io.bulk_import.
+        """
+        with self._write_lock:
+            kwargs.setdefault("index", self._index())
+            return bulk_import(source, self.phase2, LEARNED_FILE, **kwargs)
+
     def import_from_text(self, text: str) -> int:
         """
         Bulk-import from pasted/uploaded text.
         Each non-empty line becomes a new attack pattern.
         Returns count of newly added patterns.
         """
-        phrases = [
-            line.strip() for line in text.splitlines()
-            if line.strip() and not line.strip().startswith("#")
-        ]
-        if not phrases:
-            return 0
-        # Add to ChromaDB live
-        self.phase2.add_attacks(phrases)
-        # Persist each new one
-        for phrase in phrases:
-            if phrase not in {l["prompt"] for l in self._learned}:
-                self._append_to_file(phrase)
-                self._learned.append({
-                    "prompt": phrase,
-                    "variants_added": 0,
-                    "timestamp": datetime.now().strftime("%H:%M:%S"),
-                })
-        return len(phrases)
+        return self.import_file(text.splitlines(), progress=None,
+                                on_added=self._record_imported)["added"]
 
     def collection_size(self) -> int:
         return self.phase2.get_collection_size()
@@ -0,0 +1,282 @@
+"""
+bulk_scan.py — LLM Guardian Offline Bulk Scanner
+
+Re-scores large prompt logs (JSONL or CSV) after a rules / model update.
+
+  • Streams the input in chunks — never loads the whole file
+  • Fans chunks out over a process pool (one LLMGuardian per worker),
+    each chunk scored through the batched phase paths
+  • Writes verdicts incrementally to JSONL or Parquet part files
+  • Checkpoints after every chunk; re-running the same command resumes,
+    seeking straight to the recorded input byte offset
+
+Usage:
+    python bulk_scan.py prompts.jsonl verdicts.jsonl --workers 4
+    python bulk_scan.py logs.csv verdicts.parquet --text-field prompt --id-field id
+"""
+
+import os
+import sys
+import csv
+import json
+import time
+import argparse
+import itertools
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+_guardian = None
+
+
+# ─────────────────────────────────────────────
+# Input
+# ─────────────────────────────────────────────
+def iter_records(path: str, text_field: str, id_field: str = None,
+                 start_row: int = 0, offset: int = 0):
+    """
+    Yield (row_no, id, text, end) from a JSONL or CSV file, one row at a time.
+    `end` is the byte offset just past the row; a resumed scan passes the
+    last one back as `offset` (with `start_row` rows done) and seeks to it.
+    """
+    csv.field_size_limit(sys.maxsize)
+    with open(path, "rb") as f:
+        pos = 0
+
+        def lines():
+            nonlocal pos
+            for line in f:
+                pos += len(line)
+                yield line
+
+        if path.endswith(".csv"):
+            # The reader pulls lines only as a record needs them, so `pos`
+            # is the end of the row just returned (quoted newlines included).
+            rows = csv.DictReader(line.decode("utf-8") for line in lines())
+            rows.fieldnames     # header comes from the top of the file
+        else:
+            rows = (json.loads(line) for line in lines() if line.strip())
+        if offset:
+            f.seek(offset)
+            pos = offset
+        for row_no, row in enumerate(rows, start_row):
+            text = row.get(text_field)
+            yield row_no, (row.get(id_field) if id_field else row_no), "" if text is None else str(text), pos
+
+
+def iter_chunks(records, size: int):
+    """Yield (chunk of (row_no, id, text), input offset after the chunk)."""
+    while True:
+        chunk = list(itertools.islice(records, size))
+        if not chunk:
+            return
+        yield [r[:3] for r in chunk], chunk[-1][3]
+
+
+# ─────────────────────────────────────────────
+# Worker
+# ─────────────────────────────────────────────
+def _init_worker(ready=None):
+    global _guardian
+    from detector import LLMGuardian
+    _guardian = LLMGuardian()
+    if ready is not None:
+        ready.wait()    # no worker takes a task until every model is loaded
+
+
+def _warmup(_):
+    pass
+
+
+def scan_chunk(chunk: list[tuple]) -> list[dict]:
+    """Score one chunk with the worker's guardian; returns compact verdicts."""
+    results = _guardian.analyze_batch([text for _, _, text in chunk])
+    return [
+        {
+            "row":        row_no,
+            "id":         rec_id,
+            "verdict":    r["verdict"],
+            "risk_score": r["risk_score"],
+            "phase1":     r["phase1"]["score"],
+            "phase2":     r["phase2"]["score"],
+            "phase3":     r["phase3"]["score"],
+            "matches":    r["phase1"]["matches"],
+        }
+        for (row_no, rec_id, _), r in zip(chunk, results)
+    ]
+
+
+# ─────────────────────────────────────────────
+# Output + checkpoint
+# ─────────────────────────────────────────────
+class Checkpoint:
+    """Progress record, replaced atomically after every written chunk."""
+
+    def __init__(self, path: str, source: str):
+        self.path = path
+        self.state = {"input": source, "rows_done": 0, "input_bytes": 0, "output_bytes": 0, "parts": 0}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+            if saved.get("input") != source:
+                raise SystemExit(f"Checkpoint {path} belongs to {saved.get('input')}, not {source}")
+            self.state = saved
+
+    def save(self, **updates):
+        self.state.update(updates)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+
+class JsonlWriter:
+    def __init__(self, path: str, ckpt: Checkpoint):
+        self.ckpt = ckpt
+        self.f = open(path, "a+b")
+        # Drop anything written after the last checkpoint (killed mid-chunk)
+        self.f.truncate(ckpt.state["output_bytes"])
+        self.f.seek(0, os.SEEK_END)
+
+    def write(self, rows: list[dict], rows_done: int, input_bytes: int):
+        self.f.write("".join(json.dumps(r, ensure_ascii=False) + "\n" for r in rows).encode("utf-8"))
+        self.f.flush()
+        os.fsync(self.f.fileno())
+        self.ckpt.save(rows_done=rows_done, input_bytes=input_bytes, output_bytes=self.f.tell())
+
+    def close(self):
+        self.f.close()
+
+
+class ParquetWriter:
+    """One part file per flush into a directory named after the output."""
+
+    def __init__(self, path: str, ckpt: Checkpoint, rows_per_part: int = 50_000):
+        import pandas as pd
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            try:
+                import fastparquet  # noqa: F401
+            except ImportError:
+                raise SystemExit("Parquet output needs pyarrow (pip install pyarrow); use .jsonl otherwise.")
+        self.pd = pd
+        self.dir = path
+        self.ckpt = ckpt
+        self.rows_per_part = rows_per_part
+        self.buffer: list[dict] = []
+        self.rows_done = ckpt.state["rows_done"]
+        self.input_bytes = ckpt.state.get("input_bytes", 0)
+        os.makedirs(path, exist_ok=True)
+
+    def write(self, rows: list[dict], rows_done: int, input_bytes: int):
+        self.buffer.extend(rows)
+        self.rows_done = rows_done
+        self.input_bytes = input_bytes
+        if len(self.buffer) >= self.rows_per_part:
+            self._flush()
+
+    def _flush(self):
+        if not self.buffer:
+            return
+        part = self.ckpt.state["parts"]
+        df = self.pd.DataFrame(self.buffer)
+        df["matches"] = df["matches"].map(lambda m: ", ".join(m))
+        df.to_parquet(os.path.join(self.dir, f"part-{part:05d}.parquet"), index=False)
+        self.buffer = []
+        self.ckpt.save(rows_done=self.rows_done, input_bytes=self.input_bytes, parts=part + 1)
+
+    def close(self):
+        self._flush()
+
+
+# ─────────────────────────────────────────────
+# Driver
+# ─────────────────────────────────────────────
+def run(args) -> dict:
+    ckpt = Checkpoint(args.checkpoint or args.output + ".ckpt.json", os.path.abspath(args.input))
+    skip = ckpt.state["rows_done"]
+    if skip:
+        print(f"[BulkScan] Resuming after row {skip:,}.")
+
+    offset = ckpt.state.get("input_bytes")
+    if offset is None:
+        # Checkpoint written before byte offsets were recorded: re-read to the row
+        records = itertools.islice(iter_records(args.input, args.text_field, args.id_field), skip, None)
+    else:
+        records = iter_records(args.input, args.text_field, args.id_field, start_row=skip, offset=offset)
+    writer = (ParquetWriter(args.output, ckpt) if args.output.endswith(".parquet")
+              else JsonlWriter(args.output, ckpt))
+
+    scanned, rows_done, verdicts = 0, skip, {"BLOCK": 0, "REVIEW": 0, "ALLOW": 0}
+    start = None
+
+    def _emit(rows, input_bytes):
+        nonlocal scanned, rows_done
+        rows_done += len(rows)
+        scanned += len(rows)
+        for r in rows:
+            verdicts[r["verdict"]] += 1
+        writer.write(rows, rows_done, input_bytes)
+        elapsed = max(time.perf_counter() - start, 1e-9)
+        print(f"\r[BulkScan] {rows_done:,} rows  {scanned / elapsed:,.1f} prompts/s  "
+              f"({scanned / elapsed / args.workers:,.1f}/s per core)", end="", flush=True)
+
+    try:
+        if args.workers <= 1:
+            _init_worker()
+            start = time.perf_counter()      # throughput excludes model loading
+            for chunk, end in iter_chunks(records, args.chunk_size):
+                _emit(scan_chunk(chunk), end)
+        else:
+            # Bounded in-flight window keeps memory flat; results are written in order
+            ctx = multiprocessing.get_context()
+            ready = ctx.Barrier(args.workers)
+            with ProcessPoolExecutor(args.workers, mp_context=ctx, initializer=_init_worker,
+                                     initargs=(ready,)) as pool:
+                # One task per worker starts them all; the barrier holds every
+                # task until all models are loaded, so this returns when they are.
+                list(pool.map(_warmup, range(args.workers)))
+                start = time.perf_counter()
+                pending = deque()
+                for chunk, end in iter_chunks(records, args.chunk_size):
+                    pending.append((pool.submit(scan_chunk, chunk), end))
+                    if len(pending) >= 2 * args.workers:
+                        future, end = pending.popleft()
+                        _emit(future.result(), end)
+                while pending:
+                    future, end = pending.popleft()
+                    _emit(future.result(), end)
+    finally:
+        writer.close()
+        print()
+
+    elapsed = time.perf_counter() - start if start else 0.0
+    stats = {
+        "rows":           rows_done,
+        "scanned":        scanned,
+        "seconds":        round(elapsed, 1),
+        "prompts_per_s":  round(scanned / elapsed, 1) if elapsed else 0.0,
+        "per_core":       round(scanned / elapsed / args.workers, 1) if elapsed else 0.0,
+        "verdicts":       verdicts,
+    }
+    print(f"[BulkScan] Done: {stats}")
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk-scan a prompt log with LLM Guardian.")
+    parser.add_argument("input", help="JSONL or CSV file of prompts")
+    parser.add_argument("output", help="verdicts file (.jsonl) or directory (.parquet)")
+    parser.add_argument("--text-field", default="text", help="field holding the prompt (default: text)")
+    parser.add_argument("--id-field", default=None, help="field copied to each verdict as 'id'")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk-size", type=int, default=256, help="prompts per batch")
+    parser.add_argument("--checkpoint", default=None, help="default: <output>.ckpt.json")
+    return run(parser.parse_args(argv))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+"""
+candidate_store.py — LLM Guardian Candidate Review Queue
+
+Bounded, indexed store for prompts awaiting human review.
+
+  • O(1) dedupe / removal  — dict index keyed by prompt
+  • Priority ordering      — weighted novelty + risk, most interesting first
+  • Hard memory cap        — least interesting candidate evicted on overflow
+  • Optional spill         — evicted candidates appended to a local JSONL file
+                             so flood traffic is never silently lost; the
+                             write buffer is flushed on close() and at exit
+"""
+
+import os
+import json
+import atexit
+import heapq
+import itertools
+import threading
+from datetime import datetime
+
+SPILL_FILE = "candidates_spill.jsonl"
+
+
+def candidate_priority(risk_score: float, novelty_score: float) -> float:
+    """
+    Review priority: novel attacks matter most (nothing in Phase 2 covers
+    them yet), risk breaks ties. Both inputs are in [0, 1].
+    """
+    return round(0.6 * novelty_score + 0.4 * risk_score, 4)
+
+
+class CandidateStore:
+    """
+    Pending-review queue with a dict index and a lazy-deletion min-heap.
+
+    The heap holds (priority, seq, prompt) tuples; entries whose prompt was
+    removed or re-prioritised are skipped when they surface and the heap is
+    compacted once stale entries outnumber live ones.
+    """
+
+    def __init__(self, max_size: int = 5000, spill_path: str = None,
+                 spill_batch: int = 256):
+        self.max_size = max_size
+        self.spill_path = spill_path
+        self.spill_batch = spill_batch
+        self._index: dict[str, dict] = {}           # prompt → candidate
+        self._heap: list[tuple] = []                # (priority, seq, prompt)
+        self._seq = itertools.count()
+        self._spill_buffer: list[dict] = []
+        self.evicted = 0
+        self._lock = threading.Lock()
+        if spill_path:
+            atexit.register(self.close)
+
+    # ──────────────────────────────────────────────────────────────────────────
+    # Internal helpers
+    # ──────────────────────────────────────────────────────────────────────────
+
+    def _is_live(self, entry: tuple) -> bool:
+        cand = self._index.get(entry[2])
+        return cand is not None and cand["_seq"] == entry[1]
+
+    def _compact(self):
+        if len(self._heap) > 2 * len(self._index) + 64:
+            self._heap = [e for e in self._heap if self._is_live(e)]
+            heapq.heapify(self._heap)
+
+    def _peek_lowest_priority(self):
+        while self._heap and not self._is_live(self._heap[0]):
+            heapq.heappop(self._heap)
+        return self._heap[0][0] if self._heap else None
+
+    def _pop_lowest(self) -> dict:
+        while self._heap:
+            entry = heapq.heappop(self._heap)
+            if self._is_live(entry):
+                return self._index.pop(entry[2])
+        return None
+
+    def _spill(self, cand: dict):
+        if not self.spill_path:
+            return
+        self._spill_buffer.append(cand)
+        if len(self._spill_buffer) >= self.spill_batch:
+            self._flush_locked()
+
+    @staticmethod
+    def _public(cand: dict) -> dict:
+        return {k: v for k, v in cand.items() if not k.startswith("_")}
+
+    # ──────────────────────────────────────────────────────────────────────────
+    # Public API
+    # ──────────────────────────────────────────────────────────────────────────
+
+    def add(self, prompt: str, risk_score: float, novelty_score: float = 0.0) -> bool:
+        """
+        Insert a candidate. A duplicate prompt only has its scores raised.
+        Returns True if the prompt is (still) queued afterwards.
+        """
+        risk_score, novelty_score = round(risk_score, 3), round(novelty_score, 3)
+        with self._lock:
+            cand = self._index.get(prompt)
+            if cand is not None:
+                risk_score = max(cand["risk_score"], risk_score)
+                novelty_score = max(cand["novelty_score"], novelty_score)
+                priority = candidate_priority(risk_score, novelty_score)
+                if priority <= cand["_priority"]:
+                    return True
+                cand["risk_score"] = risk_score
+                cand["novelty_score"] = novelty_score
+            else:
+                priority = candidate_priority(risk_score, novelty_score)
+                cand = {
+                    "prompt":        prompt,
+                    "risk_score":    risk_score,
+                    "novelty_score": novelty_score,
+                    "timestamp":     datetime.now().strftime("%H:%M:%S"),
+                }
+                # Full queue: drop the newcomer if it's the least interesting
+                if len(self._index) >= self.max_size:
+                    lowest = self._peek_lowest_priority()
+                    if lowest is not None and priority <= lowest:
+                        self.evicted += 1
+                        self._spill(cand)
+                        return False
+                self._index[prompt] = cand
+
+            seq = next(self._seq)
+            cand["_priority"] = priority
+            cand["_seq"] = seq
+            heapq.heappush(self._heap, (priority, seq, prompt))
+
+            while len(self._index) > self.max_size:
+                victim = self._pop_lowest()
+                if victim is None:
+                    break
+                self.evicted += 1
+                self._spill(self._public(victim))
+            self._compact()
+            return prompt in self._index
+
+    def remove(self, prompt: str) -> dict:
+        """O(1) removal; the heap entry goes stale and is skipped later."""
+        with self._lock:
+            cand = self._index.pop(prompt, None)
+            self._compact()
+            return self._public(cand) if cand else None
+
+    def __contains__(self, prompt: str) -> bool:
+        return prompt in self._index
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def top(self, n: int = None) -> list[dict]:
+        """Candidates ordered most-interesting first (up to n)."""
+        with self._lock:
+            cands = list(self._index.values())
+        if n is None:
+            ordered = sorted(cands, key=lambda c: (-c["_priority"], c["_seq"]))
+        else:
+            ordered = heapq.nsmallest(n, cands, key=lambda c: (-c["_priority"], c["_seq"]))
+        return [self._public(c) for c in ordered]
+
+    # ──────────────────────────────────────────────────────────────────────────
+    # Spill file
+    # ──────────────────────────────────────────────────────────────────────────
+
+    def _flush_locked(self):
+        # Caller holds _lock, so add() can't append while the buffer is written
+        if not self._spill_buffer or not self.spill_path:
+            return
+        buf, self._spill_buffer = self._spill_buffer, []
+        with open(self.spill_path, "a", encoding="utf-8") as f:
+            f.write("".join(json.dumps(c, ensure_ascii=False) + "\n" for c in buf))
+
+    def flush(self):
+        """Write buffered evictions to the spill file."""
+        with self._lock:
+            self._flush_locked()
+
+    def close(self):
+        """Flush the spill buffer; also runs at interpreter exit."""
+        self.flush()
+        atexit.unregister(self.close)
+
+    def iter_spilled(self):
+        """Stream spilled candidates back (oldest first) for offline review."""
+        self.flush()
+        if not self.spill_path or not os.path.exists(self.spill_path):
+            return
+        with open(self.spill_path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+
+if __name__ == "__main__":
+    import time
+    import random
+    import tracemalloc
+
+    # Flood benchmark: 1M unique candidates through a 5k-capacity queue
+    store = CandidateStore(max_size=5000)
+    tracemalloc.start()
+    start = time.perf_counter()
+    for i in range(1_000_000):
+        store.add(f"attack variant {i}", random.random(), random.random())
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print("=" * 60)
+    print(f"Queued   : {len(store):,}   evicted: {store.evicted:,}")
+    print(f"Rate     : {1_000_000 / elapsed:,.0f} adds/s")
+    print(f"Peak mem : {peak / 1e6:.1f} MB")
+    for c in store.top(3):
+        print(f"  {c}")
@@ -0,0 +1,368 @@
+"""
+corpus_io.py — LLM Guardian Learned-Corpus Bulk Import / Export
+
+Streams attack-phrase files of any size into learned_attacks.txt (and
+optionally the live Phase 2 index) and back out again.
+
+  • PhraseIndex  — persistent SQLite set of phrase hashes; dedupes across
+                   runs without holding the corpus in memory, and rebuilds
+                   itself if learned_attacks.txt was edited by hand
+  • bulk_import  — read → dedupe → encode → write in fixed-size batches
+                   with progress; without `phase2` only one batch is held
+                   in memory, with it the new phrases and their embeddings
+                   are also held until published, every `publish_every`
+  • append_phrases — the same dedupe + write for a few phrases (approvals),
+                   so every writer keeps the index in step with the file
+  • iter_export / export_to — stream the learned corpus back out (.txt/.jsonl)
+
+Usage:
+    python corpus_io.py import phrases.txt            # offline; the service
+                                                       # encodes on hot reload
+    python corpus_io.py import phrases.txt --encode   # encode while importing
+    python corpus_io.py export learned_backup.jsonl
+"""
+
+import os
+import sys
+import json
+import time
+import sqlite3
+import hashlib
+import argparse
+import itertools
+import contextlib
+import threading
+
+import numpy as np
+
+from hot_reload import owned_writes
+
+LEARNED_FILE = "learned_attacks.txt"
+INDEX_FILE = ".learned_index.sqlite"
+
+
+def phrase_key(phrase: str) -> bytes:
+    return hashlib.blake2b(phrase.encode("utf-8"), digest_size=16).digest()
+
+
+def iter_phrases(source):
+    """Attack phrases from a file path or an iterable of lines, one at a time."""
+    if isinstance(source, str):
+        with open(source, "r", encoding="utf-8") as f:
+            yield from iter_phrases(f)
+        return
+    for line in source:
+        line = line.strip()
+        if line and not line.startswith("#"):
+            yield line
+
+
+def _batches(iterable, size: int):
+    it = iter(iterable)
+    while True:
+        batch = list(itertools.islice(it, size))
+        if not batch:
+            return
+        yield batch
+
+
+# ─────────────────────────────────────────────
+# Persistent dedupe index
+# ─────────────────────────────────────────────
+class PhraseIndex:
+    """
+    Set of phrase hashes in SQLite (16 bytes per phrase on disk, a bounded
+    page cache in memory). Tracks the size of the attack file it mirrors;
+    if the file no longer matches (checked on open and before every
+    dedupe / insert), the index is rebuilt from it.
+    """
+
+    def __init__(self, path: str = INDEX_FILE, learned_file: str = LEARNED_FILE):
+        self.path = path
+        self.learned_file = learned_file
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA cache_size=-16000")          # ~16 MB page cache
+        self._conn.execute("CREATE TABLE IF NOT EXISTS phrases (key BLOB PRIMARY KEY) WITHOUT ROWID")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER)")
+        self._conn.commit()
+        with self._lock:
+            self._sync_locked()
+
+    def _recorded_size(self) -> int:
+        row = self._conn.execute("SELECT value FROM meta WHERE name = 'learned_size'").fetchone()
+        return row[0] if row else 0
+
+    def _file_size(self) -> int:
+        return os.path.getsize(self.learned_file) if os.path.exists(self.learned_file) else 0
+
+    def _sync_locked(self, expected: int = None):
+        """
+        Rebuild from the file if it doesn't have the recorded size (or
+        `expected`). Callers hold _lock. Returns True if it rebuilt.
+        """
+        expected = self._recorded_size() if expected is None else expected
+        if self._file_size() == expected:
+            return False
+        print(f"[CorpusIO] {self.learned_file} changed outside the importer — rebuilding index.")
+        with self._conn:
+            self._conn.execute("DELETE FROM phrases")
+            if os.path.exists(self.learned_file):
+                for batch in _batches(iter_phrases(self.learned_file), 10_000):
+                    self._conn.executemany("INSERT OR IGNORE INTO phrases VALUES (?)",
+                                           ((phrase_key(p),) for p in batch))
+            self._set_size(self._file_size())
+        return True
+
+    def _set_size(self, size: int):
+        self._conn.execute("INSERT OR REPLACE INTO meta VALUES ('learned_size', ?)", (size,))
+
+    def filter_new(self, phrases: list[str]) -> list[str]:
+        """Phrases (deduplicated, in order) not yet in the index."""
+        keys = {}
+        for p in phrases:
+            keys.setdefault(phrase_key(p), p)
+        known = set()
+        items = list(keys)
+        with self._lock:
+            self._sync_locked()
+            for i in range(0, len(items), 500):
+                chunk = items[i:i + 500]
+                marks = ",".join("?" * len(chunk))
+                known.update(row[0] for row in self._conn.execute(
+                    f"SELECT key FROM phrases WHERE key IN ({marks})", chunk))
+        return [p for k, p in keys.items() if k not in known]
+
+    def add(self, phrases: list[str], learned_size: int = None, previous_size: int = None):
+        """
+        Record phrases (after they were written) and the file size that holds
+        them. With `previous_size` (the size before the write), an edit made
+        since filter_new() triggers a rebuild, which picks the phrases up
+        from the file.
+        """
+        with self._lock:
+            if previous_size is not None and self._recorded_size() != previous_size:
+                self._sync_locked(expected=-1)
+                return
+            with self._conn:
+                self._conn.executemany("INSERT OR IGNORE INTO phrases VALUES (?)",
+                                       ((phrase_key(p),) for p in phrases))
+                if learned_size is not None:
+                    self._set_size(learned_size)
+
+    def __contains__(self, phrase: str) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM phrases WHERE key = ?",
+                                      (phrase_key(phrase),)).fetchone() is not None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM phrases").fetchone()[0]
+
+    def close(self):
+        self._conn.close()
+
+
+# ─────────────────────────────────────────────
+# Import
+# ─────────────────────────────────────────────
+def _write(out, index: PhraseIndex, new: list[str]):
+    """Append already-deduplicated phrases to the open file, then index them."""
+    before = out.tell()
+    out.write("".join(p + "\n" for p in new))
+    out.flush()
+    index.add(new, learned_size=out.tell(), previous_size=before)
+
+
+def append_phrases(phrases: list[str], learned_file: str = LEARNED_FILE,
+                   index: PhraseIndex = None) -> list[str]:
+    """
+    Append phrases not yet in the corpus to `learned_file`, recording them
+    (and the new file size) in the index. Returns the phrases written.
+    """
+    own_index = index is None
+    if own_index:
+        index = PhraseIndex(learned_file=learned_file)
+    try:
+        new = index.filter_new(phrases)
+        if new:
+            with open(learned_file, "a", encoding="utf-8") as out:
+                _write(out, index, new)
+        return new
+    finally:
+        if own_index:
+            index.close()
+
+
+def _print_progress(stats: dict):
+    print(f"\r[CorpusIO] {stats['read']:,} read  {stats['added']:,} new  "
+          f"{stats['duplicates']:,} duplicate  {stats['lines_per_s']:,.0f} lines/s",
+          end="", flush=True)
+
+
+def bulk_import(source, phase2=None, learned_file: str = LEARNED_FILE, index: PhraseIndex = None,
+                batch_size: int = 1024, publish_every: int = 50_000,
+                progress_every: int = 50_000, progress=_print_progress,
+                on_added=None) -> dict:
+    """
+    Stream phrases from `source` (path or iterable of lines) into
+    `learned_file`, skipping any the persistent index has seen.
+
+    With `phase2`, each batch of new phrases is encoded straight away and
+    published to the live index every `publish_every` phrases (so up to
+    that many phrases and embeddings are held in memory); without it
+    the import is text-only and the running service encodes the new lines
+    when it hot-reloads the file. With `phase2` the writes are marked as
+    owned (hot_reload.owned_writes), so a watcher in this process doesn't
+    re-read and re-encode the file while the import publishes itself.
+    `on_added(phrases)` is called with each batch of newly written phrases.
+
+    A batch is written and flushed before its hashes are committed, so an
+    interrupted import never loses phrases; the next run sees the file
+    size mismatch and re-indexes from the file.
+    """
+    own_index = index is None
+    if own_index:
+        index = PhraseIndex(learned_file=learned_file)
+    stats = {"read": 0, "added": 0, "duplicates": 0, "published": 0, "lines_per_s": 0.0}
+    pending_phrases, pending_emb = [], []
+    start = time.perf_counter()
+    next_report = progress_every
+
+    def _publish():
+        if pending_phrases:
+            stats["published"] += phase2.add_encoded(pending_phrases, np.vstack(pending_emb))
+            pending_phrases.clear()
+            pending_emb.clear()
+
+    try:
+        with contextlib.ExitStack() as stack:
+            if phase2 is not None:
+                stack.enter_context(owned_writes(learned_file))
+            out = stack.enter_context(open(learned_file, "a", encoding="utf-8"))
+            for batch in _batches(iter_phrases(source), batch_size):
+                new = index.filter_new(batch)
+                stats["read"] += len(batch)
+                stats["duplicates"] += len(batch) - len(new)
+                if new:
+                    if phase2 is not None:
+                        pending_emb.append(phase2._encode(new))
+                        pending_phrases.extend(new)
+                        if len(pending_phrases) >= publish_every:
+                            _publish()
+                    _write(out, index, new)
+                    stats["added"] += len(new)
+                    if on_added is not None:
+                        on_added(new)
+                if progress and stats["read"] >= next_report:
+                    stats["lines_per_s"] = stats["read"] / max(time.perf_counter() - start, 1e-9)
+                    progress(stats)
+                    next_report += progress_every
+            if phase2 is not None:
+                _publish()
+    finally:
+        if own_index:
+            index.close()
+
+    elapsed = time.perf_counter() - start
+    stats["seconds"] = round(elapsed, 2)
+    stats["lines_per_s"] = round(stats["read"] / max(elapsed, 1e-9), 1)
+    if progress:
+        progress(stats)
+        print()
+    return stats
+
+
+# ─────────────────────────────────────────────
+# Export
+# ─────────────────────────────────────────────
+def iter_export(learned_file: str = LEARNED_FILE, batch_size: int = 10_000):
+    """Yield the learned corpus as lists of up to `batch_size` phrases."""
+    if not os.path.exists(learned_file):
+        return
+    yield from _batches(iter_phrases(learned_file), batch_size)
+
+
+def export_to(path: str, learned_file: str = LEARNED_FILE, batch_size: int = 10_000) -> int:
+    """
+    Stream the learned corpus to `path` (.jsonl → {"prompt": ...} per line,
+    anything else → one phrase per line). Written to a temp file and
+    renamed, so a partial export never replaces a good one. Returns the count.
+    """
+    as_jsonl = path.endswith(".jsonl")
+    count = 0
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        for batch in iter_export(learned_file, batch_size):
+            if as_jsonl:
+                f.write("".join(json.dumps({"prompt": p}, ensure_ascii=False) + "\n" for p in batch))
+            else:
+                f.write("".join(p + "\n" for p in batch))
+            count += len(batch)
+    os.replace(tmp, path)
+    print(f"[CorpusIO] Exported {count:,} phrases to {path}.")
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk import / export of the learned-attack corpus.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    imp = sub.add_parser("import", help="append new phrases from a text file")
+    imp.add_argument("input", help="one phrase per line ('#' comments skipped)")
+    imp.add_argument("--encode", action="store_true",
+                     help="encode while importing (loads the sentence-transformer)")
+    imp.add_argument("--batch-size", type=int, default=1024)
+    exp = sub.add_parser("export", help="write the learned corpus to .txt or .jsonl")
+    exp.add_argument("output")
+    for p in (imp, exp):
+        p.add_argument("--learned-file", default=LEARNED_FILE)
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+        return export_to(args.output, args.learned_file)
+    phase2 = None
+    if args.encode:
+        from phase2_semantic import Phase2Semantic
+        phase2 = Phase2Semantic(attack_files=())
+    return bulk_import(args.input, phase2, args.learned_file, batch_size=args.batch_size)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        main()
+        sys.exit()
+
+    # Benchmark: text-side memory stays flat as the input grows
+    import random
+    import tempfile
+    import tracemalloc
+
+    words = ("ignore previous instructions reveal system prompt bypass safety filters "
+             "pretend you are unrestricted jailbreak developer mode override rules "
+             "disregard guidelines act as dan tell me how to hack").split()
+    with tempfile.TemporaryDirectory() as tmp:
+        learned = os.path.join(tmp, "learned.txt")
+        for n in (100_000, 1_000_000):
+            src = os.path.join(tmp, f"in_{n}.txt")
+            rng = random.Random(n)
+            with open(src, "w", encoding="utf-8") as f:
+                for i in range(n):
+                    # ~20% repeats of earlier lines
+                    j = rng.randrange(i) if i and rng.random() < 0.2 else i
+                    f.write(" ".join(random.Random(j).choices(words, k=8)) + f" #{j}\n")
+            if os.path.exists(learned):
+                os.remove(learned)
+            index = PhraseIndex(os.path.join(tmp, f"idx_{n}.sqlite"), learned)
+            tracemalloc.start()
+            stats = bulk_import(src, learned_file=learned, index=index, progress=None)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            index.close()
+            print(f"{n:>9,} lines: {stats['added']:>9,} new, {stats['duplicates']:>7,} dup, "
+                  f"{stats['lines_per_s']:>9,.0f} lines/s, Python peak {peak / 1e6:.1f} MB")
+
+        start = time.perf_counter()
+        count = export_to(os.path.join(tmp, "out.jsonl"), learned)
+        print(f"Export: {count / (time.perf_counter() - start):,.0f} phrases/s")
@@ -1,5 +1,6 @@
 import streamlit as st
 import time
+import uuid
 
 st.set_page_config(page_title="LLM Guardian", layout="centered", initial_sidebar_state="collapsed")
 
@@ -153,7 +154,9 @@ section[data-testid="stSidebar"] { display: none !important; }
 @st.cache_resource(show_spinner=False)
 def load_guardian():
     from detector import LLMGuardian
-    return LLMGuardian()
+    guardian = LLMGuardian()
+    guardian.watch()        # hot-reload rules.json / attacks.txt on change
+    return guardian
 
 @st.cache_resource(show_spinner=False)
 def load_learner(_guardian):
@@ -164,6 +167,10 @@ with st.spinner(""):
     guardian = load_guardian()
     learner  = load_learner(guardian)
 
+# Probing is tracked per browser session, not per process
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+
 
 # ── Layout ────────────────────────────────────────────────────────────────────
 st.markdown('<div class="brand">AI Security</div>', unsafe_allow_html=True)
@@ -199,7 +206,11 @@ if clicked:
         if verdict in ("BLOCK", "REVIEW"):
             p2_score = result["phase2"]["score"]
             novelty  = round(max(0.0, 1.0 - p2_score), 3)
-            learner.record_block(prompt.strip(), risk)
+            if learner.probes.should_escalate(st.session_state.session_id, verdict):
+                verdict = "BLOCK"
+            learner.record_block(prompt.strip(), risk,
+                                 session_id=st.session_state.session_id,
+                                 verdict=verdict)
             learner.add_candidate(prompt.strip(), risk, novelty)
 
         if verdict == "BLOCK":
@@ -1,86 +1,341 @@
 import time
 import os
 import csv
+import hashlib
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import NamedTuple
+import numpy as np
 import pandas as pd
+from scipy import sparse
 from datetime import datetime
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.linear_model import LogisticRegression
-from sklearn.model_selection import train_test_split
 from sklearn.metrics import f1_score, accuracy_score
 
 from preprocessor import get_preprocessor
 from phase1_rules import Phase1Rules
 from phase2_semantic import Phase2Semantic
+from hot_reload import FileWatcher
+from embedding_cache import EmbeddingCache
+from admission import LatencyTracker, AdmissionController
+from near_dup import NearDupIndex
 
 DATA_FILE = "jailbreak_data.csv"
 FEEDBACK_FILE = "feedback.csv"
+EMBEDDING_CACHE_FILE = ".phase3_embeddings.npz"
+PHASE3_FEATURES = ("tfidf", "embedding", "embedding+tfidf")
+
+# Fusion weights (Phase 1, 2, 3) and verdict cutoffs
+WEIGHTS = (0.25, 0.35, 0.40)
+BLOCK_THRESHOLD = 0.45
+ALLOW_THRESHOLD = 0.2
+
+# Background Phase 3 retrains run one at a time, off the request path
+_RETRAIN_THREAD = ThreadPoolExecutor(max_workers=1, thread_name_prefix="phase3-retrain")
+
+
+def fuse_scores(p1: float, p2: float, p3: float, weights=WEIGHTS) -> float:
+    """Weighted combination of the three phase scores, capped at 1.0."""
+    return round(min(1.0, weights[0] * p1 + weights[1] * p2 + weights[2] * p3), 4)
+
+
+def verdict_for(risk_score: float, block: float = BLOCK_THRESHOLD,
+                allow: float = ALLOW_THRESHOLD) -> str:
+    if risk_score >= block:
+        return "BLOCK"
+    if risk_score < allow:
+        return "ALLOW"
+    return "REVIEW"
 
 
 # ─────────────────────────────────────────────
 # Phase 3: ML Model (trained from CSV + feedback)
 # ─────────────────────────────────────────────
+def make_vectorizer() -> TfidfVectorizer:
+    return TfidfVectorizer(max_features=5000, ngram_range=(1, 2))
+
+
+def make_classifier() -> LogisticRegression:
+    return LogisticRegression(C=1.0, max_iter=1000, random_state=42)
+
+
+def load_training_data():
+    """Load base dataset + any human feedback → (texts, labels)."""
+    df = pd.read_csv(DATA_FILE).dropna(subset=["text", "label"])
+
+    # Append feedback if it exists
+    if os.path.exists(FEEDBACK_FILE):
+        try:
+            fb = pd.read_csv(FEEDBACK_FILE).dropna(subset=["text", "label"])
+            if len(fb) > 0:
+                df = pd.concat([df, fb[["text", "label"]]], ignore_index=True)
+                print(f"[Phase3] Loaded {len(fb)} feedback samples.")
+        except Exception as e:
+            print(f"[Phase3] Could not load feedback: {e}")
+
+    return df["text"].astype(str).tolist(), df["label"].astype(int).tolist()
+
+
+class Phase3Model(NamedTuple):
+    """
+    Fitted vectorizer + classifier and their holdout metrics. Replaced as
+    one reference on retrain, so predict() never pairs a new vectorizer
+    with an old classifier.
+    """
+    vectorizer: object          # None in "embedding" mode
+    classifier: object
+    accuracy: float
+    f1: float
+    train_count: int
+
+
+def featurize(features: str, vectorizer, texts: list[str], embeddings=None, fit: bool = False):
+    """Feature matrix for `texts` under one model's representation."""
+    parts = []
+    if features != "tfidf":
+        parts.append(sparse.csr_matrix(np.asarray(embeddings, dtype=np.float32)))
+    if vectorizer is not None:
+        parts.append(vectorizer.fit_transform(texts) if fit else vectorizer.transform(texts))
+    return parts[0] if len(parts) == 1 else sparse.hstack(parts, format="csr")
+
+
+def _lower_priority():
+    """Retrain worker initializer: yield the CPU to request handling."""
+    if hasattr(os, "nice"):
+        os.nice(10)
+
+
+def _rows(seq, idx):
+    return None if seq is None else [seq[i] for i in idx]
+
+
+def in_holdout(text: str) -> bool:
+    """
+    Fixed ~20% holdout by text hash. A row is on the same side in every
+    snapshot, so no model — live or candidate — ever trains on the rows
+    they are compared on, and duplicate texts can't straddle the split.
+    """
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest()[0] < 52
+
+
+def fit_phase3(features: str, texts: list[str], labels: list[int], embeddings=None,
+               live: Phase3Model = None, recent=None) -> dict:
+    """
+    Fit a candidate model on a data snapshot. Also runs the shadow
+    evaluation against `live`: both are scored on the fixed holdout
+    (`in_holdout`), which neither trained on, and on `recent` =
+    (texts, embeddings) from live traffic. Module-level and side-effect
+    free so it can run in a worker process.
+    """
+    test = np.fromiter((in_holdout(t) for t in texts), dtype=bool, count=len(texts))
+    idx_train, idx_test = np.flatnonzero(~test), np.flatnonzero(test)
+    vectorizer = make_vectorizer() if "tfidf" in features else None
+    classifier = make_classifier()
+    X_train = featurize(features, vectorizer, _rows(texts, idx_train),
+                        _rows(embeddings, idx_train), fit=True)
+    classifier.fit(X_train, [labels[i] for i in idx_train])
+
+    def holdout(model: Phase3Model):
+        X = featurize(features, model.vectorizer, _rows(texts, idx_test), _rows(embeddings, idx_test))
+        y_true, y_pred = [labels[i] for i in idx_test], model.classifier.predict(X)
+        return round(accuracy_score(y_true, y_pred) * 100, 1), round(f1_score(y_true, y_pred) * 100, 1)
+
+    candidate = Phase3Model(vectorizer, classifier, 0.0, 0.0, len(texts))
+    accuracy, f1 = holdout(candidate)
+    candidate = candidate._replace(accuracy=accuracy, f1=f1)
+    result = {"candidate": candidate, "live_holdout": None, "agreement": None, "shadow_n": 0}
+
+    if live is not None:
+        result["live_holdout"] = holdout(live)
+        if recent and recent[0]:
+            r_texts, r_embs = recent
+            old = live.classifier.predict(featurize(features, live.vectorizer, r_texts, r_embs))
+            new = classifier.predict(featurize(features, vectorizer, r_texts, r_embs))
+            result["agreement"] = round(float(np.mean(old == new)), 3)
+            result["shadow_n"] = len(r_texts)
+    return result
+
+
 class Phase3ML:
-    def __init__(self):
-        self.vectorizer = TfidfVectorizer(max_features=5000, ngram_range=(1, 2))
-        self.model = LogisticRegression(C=1.0, max_iter=1000, random_state=42)
-        self.accuracy = 0.0
-        self.f1 = 0.0
-        self.train_count = 0
-        self._train()
+    """
+    Attack classifier. `features` selects the input representation:
+      "tfidf"            — 5000-feature word/bigram TF-IDF (default)
+      "embedding"        — the MiniLM sentence embedding Phase 2 computes anyway
+      "embedding+tfidf"  — both, concatenated
+    Embedding modes need `encoder` (the live Phase2Semantic); training-set
+    embeddings are cached on disk so retrains don't re-encode old rows.
 
-    def _load_data(self):
-        """Load base dataset + any human feedback."""
-        df = pd.read_csv(DATA_FILE).dropna(subset=["text", "label"])
+    The fitted model lives in one immutable Phase3Model. retrain() fits a
+    candidate off the request path (worker process by default), shadow-
+    scores it against the live model and swaps the reference only if it
+    doesn't regress.
+    """
 
-        # Append feedback if it exists
-        if os.path.exists(FEEDBACK_FILE):
-            try:
-                fb = pd.read_csv(FEEDBACK_FILE).dropna(subset=["text", "label"])
-                if len(fb) > 0:
-                    df = pd.concat([df, fb[["text", "label"]]], ignore_index=True)
-                    print(f"[Phase3] Loaded {len(fb)} feedback samples.")
-            except Exception as e:
-                print(f"[Phase3] Could not load feedback: {e}")
+    def __init__(self, features: str = "tfidf", encoder=None, shadow_size: int = 500,
+                 max_f1_drop: float = 0.0, min_agreement: float = 0.8):
+        """
+        Args:
+            shadow_size:   recent prompts kept for shadow scoring a candidate.
+            max_f1_drop:   holdout F1 points a candidate may lose and still swap.
+            min_agreement: share of recent prompts on which candidate and live
+                           model must agree (large flips need a human look).
+        """
+        if features not in PHASE3_FEATURES:
+            raise ValueError(f"features must be one of {PHASE3_FEATURES}")
+        if features != "tfidf" and encoder is None:
+            raise ValueError(f"features={features!r} needs a Phase2Semantic encoder")
+        self.features = features
+        self.encoder = encoder
+        self.max_f1_drop = max_f1_drop
+        self.min_agreement = min_agreement
+        self._train_cache = EmbeddingCache(EMBEDDING_CACHE_FILE) if encoder is not None else None
+        self._recent: deque = deque(maxlen=shadow_size)     # (text, embedding or None)
+        self._retrain_pool = None
+        self._retrain_future = None
+        self._retrain_lock = threading.Lock()
+        self._model: Phase3Model = self._fit(None)["candidate"]
+        print(f"[Phase3] Trained ({self.features}) on {self.train_count} samples — "
+              f"Accuracy: {self.accuracy}%, F1: {self.f1}%")
+
+    @property
+    def uses_embeddings(self) -> bool:
+        return self.features != "tfidf"
+
+    @property
+    def model(self) -> Phase3Model:
+        return self._model
+
+    @property
+    def accuracy(self) -> float:
+        return self._model.accuracy
+
+    @property
+    def f1(self) -> float:
+        return self._model.f1
 
-        return df["text"].astype(str).tolist(), df["label"].astype(int).tolist()
+    @property
+    def train_count(self) -> int:
+        return self._model.train_count
 
-    def _train(self):
+    def _load_data(self):
+        return load_training_data()
+
+    def _featurize(self, texts: list[str], embeddings=None, model: Phase3Model = None):
+        """Feature matrix for `texts`; `embeddings` are reused if supplied."""
+        if self.uses_embeddings and embeddings is None:
+            embeddings = self.encoder._encode(texts)
+        return featurize(self.features, (model or self._model).vectorizer, texts, embeddings)
+
+    def _snapshot(self):
+        """Training data (+ cached embeddings) as of now."""
         X, y = self._load_data()
-        self.train_count = len(X)
+        embeddings = None
+        if self.uses_embeddings:
+            embeddings = self._train_cache.encode(X, self.encoder._encode)
+            self._train_cache.save()
+        return X, y, embeddings
 
-        X_vec = self.vectorizer.fit_transform(X)
-        X_train, X_test, y_train, y_test = train_test_split(
-            X_vec, y, test_size=0.2, random_state=42, stratify=y
-        )
-        self.model.fit(X_train, y_train)
+    def _fit(self, live: Phase3Model, pool=None) -> dict:
+        X, y, embeddings = self._snapshot()
+        recent = None
+        if live is not None:
+            items = list(self._recent)
+            texts = [t for t, _ in items]
+            embs = None
+            if self.uses_embeddings and items:
+                missing = [t for t, e in items if e is None]
+                fresh = iter(self.encoder._encode(missing)) if missing else iter(())
+                embs = [e if e is not None else next(fresh) for _, e in items]
+            recent = (texts, embs)
+        args = (self.features, X, y, embeddings, live, recent)
+        return pool.submit(fit_phase3, *args).result() if pool is not None else fit_phase3(*args)
 
-        y_pred = self.model.predict(X_test)
-        self.accuracy = round(accuracy_score(y_test, y_pred) * 100, 1)
-        self.f1 = round(f1_score(y_test, y_pred) * 100, 1)
-        print(f"[Phase3] Trained on {self.train_count} samples — Accuracy: {self.accuracy}%, F1: {self.f1}%")
+    def _retrain(self, use_process: bool) -> dict:
+        live = self._model
+        pool = None
+        if use_process:
+            if self._retrain_pool is None:
+                # spawn, not fork: the parent has model and server threads running
+                self._retrain_pool = ProcessPoolExecutor(
+                    max_workers=1, mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_lower_priority)
+            pool = self._retrain_pool
+        try:
+            fitted = self._fit(live, pool)
+        except BrokenProcessPool:
+            # Worker died (e.g. OOM-killed): start a fresh pool next time
+            self._retrain_pool = None
+            pool.shutdown(wait=False)
+            print("[Phase3] Retrain worker died — pool will be recreated on the next retrain.")
+            raise
+        candidate = fitted["candidate"]
+        live_acc, live_f1 = fitted["live_holdout"]
+        agreement = fitted["agreement"]
 
-    def retrain(self) -> dict:
-        """Retrain model including feedback data. Returns improvement stats."""
-        old_acc = self.accuracy
-        old_f1 = self.f1
-        self._train()
+        reasons = []
+        if candidate.f1 < live_f1 - self.max_f1_drop:
+            reasons.append(f"holdout F1 {candidate.f1} < live {live_f1}")
+        if agreement is not None and agreement < self.min_agreement:
+            reasons.append(f"agrees with live model on {agreement:.0%} of recent traffic")
+        swapped = not reasons
+        if swapped:
+            self._model = candidate          # atomic: one reference assignment
+        print(f"[Phase3] Retrain candidate F1 {candidate.f1}% vs live {live_f1}% "
+              f"(shadow agreement {agreement}) — "
+              f"{'swapped in' if swapped else 'kept live model: ' + '; '.join(reasons)}")
         return {
-            "old_accuracy": old_acc,
-            "new_accuracy": self.accuracy,
-            "old_f1": old_f1,
-            "new_f1": self.f1,
-            "train_count": self.train_count,
-            "improved": self.accuracy > old_acc
+            "old_accuracy": live.accuracy,
+            "new_accuracy": candidate.accuracy,
+            "old_f1": live.f1,
+            "new_f1": candidate.f1,
+            "live_holdout_accuracy": live_acc,
+            "live_holdout_f1": live_f1,
+            "shadow_agreement": agreement,
+            "shadow_samples": fitted["shadow_n"],
+            "train_count": candidate.train_count,
+            "improved": candidate.accuracy > live_acc,
+            "swapped": swapped,
+            "rejected_because": reasons,
         }
 
-    def predict(self, prompt: str) -> dict:
-        X = self.vectorizer.transform([prompt])
-        proba = self.model.predict_proba(X)[0]
-        score = float(proba[1])
-        return {
-            "score": round(score, 3),
-            "explanation": f"ML confidence: {score*100:.1f}% attack probability"
-        }
+    def retrain_async(self, use_process: bool = True) -> Future:
+        """
+        Start a background retrain on a snapshot of the data; returns a
+        Future of the stats dict. Detection keeps using the live model
+        until (and unless) the candidate is swapped in. A retrain already
+        running is returned instead of starting a second one.
+        """
+        with self._retrain_lock:
+            if self._retrain_future is None or self._retrain_future.done():
+                self._retrain_future = _RETRAIN_THREAD.submit(self._retrain, use_process)
+            return self._retrain_future
+
+    def retrain(self, use_process: bool = True) -> dict:
+        """Retrain model including feedback data. Returns improvement stats."""
+        return self.retrain_async(use_process).result()
+
+    def predict(self, prompt: str, embedding=None) -> dict:
+        return self.predict_batch([prompt], None if embedding is None else [embedding])[0]
+
+    def predict_batch(self, prompts: list[str], embeddings=None) -> list[dict]:
+        model = self._model
+        if self.uses_embeddings and embeddings is None:
+            embeddings = self.encoder._encode(prompts)
+        X = featurize(self.features, model.vectorizer, prompts, embeddings)
+        scores = model.classifier.predict_proba(X)[:, 1]
+        for i, prompt in enumerate(prompts):
+            self._recent.append((prompt, None if embeddings is None else embeddings[i]))
+        return [
+            {
+                "score": round(float(score), 3),
+                "explanation": f"ML confidence: {float(score)*100:.1f}% attack probability"
+            }
+            for score in scores
+        ]
 
 
 # ─────────────────────────────────────────────
@@ -114,39 +369,216 @@ def get_feedback_count() -> int:
 # Hybrid Detector — combines all phases
 # ─────────────────────────────────────────────
 class LLMGuardian:
-    def __init__(self):
+    def __init__(self, weights=WEIGHTS, block_threshold: float = BLOCK_THRESHOLD,
+                 allow_threshold: float = ALLOW_THRESHOLD, phase3_features: str = "tfidf",
+                 admission: AdmissionController = None, near_dup: NearDupIndex = None):
+        """
+        Args:
+            weights:         Phase 1/2/3 fusion weights (see tuning.py to fit them).
+            block_threshold: risk at or above which the verdict is BLOCK.
+            allow_threshold: risk below which the verdict is ALLOW.
+            phase3_features: "tfidf", "embedding" or "embedding+tfidf" — the
+                             embedding modes reuse Phase 2's encoder pass.
+            admission:       optional AdmissionController; under load it
+                             degrades to Phase 1 + 3 or sheds requests.
+            near_dup:        optional NearDupIndex; near-duplicates of recently
+                             scored prompts reuse their Phase 2 result (and a
+                             BLOCK verdict) instead of re-encoding.
+        """
         print("Initializing LLM Guardian V2...")
+        self.weights = tuple(weights)
+        self.block_threshold = block_threshold
+        self.allow_threshold = allow_threshold
         self.preprocessor = get_preprocessor()
         self.phase1 = Phase1Rules()
         self.phase2 = Phase2Semantic()
-        self.phase3 = Phase3ML()
+        self.phase3 = Phase3ML(phase3_features, encoder=self.phase2)
+        self._watcher = None
+        self.latency = LatencyTracker()
+        self.admission = admission
+        self.near_dup = near_dup
+        self._dup_index = self.phase2.index
         print("✅ All systems online.")
 
-    def analyze(self, prompt: str) -> dict:
+    def analyze(self, prompt: str, deadline_ms: float = None) -> dict:
+        """
+        Score a prompt. With `deadline_ms`, phases whose live latency
+        estimate doesn't fit the remaining budget are skipped (Phase 2
+        first); the result then has degraded=True and phases_skipped set.
+        Raises GuardianOverloaded if the admission controller sheds it.
+        """
+        return self._admit(prompt, deadline_ms)
+
+    def _admit(self, prompt: str, deadline_ms, **scope) -> dict:
+        if self.admission is None:
+            return self._analyze(prompt, deadline_ms, "full", **scope)
+        with self.admission.admit() as mode:
+            return self._analyze(prompt, deadline_ms, mode, **scope)
+
+    def _plan(self, budget_ms, mode: str) -> set:
+        """Phases to run: cheapest, highest-value first, within the budget."""
+        if mode == "degraded":
+            return {"phase1", "phase3"}
+        if budget_ms is None:
+            return {"phase1", "phase2", "phase3"}
+        est = self.latency.estimate
+        plan, spent = {"phase1"}, est("phase1")
+        p3_cost = est("phase3")
+        if spent + est("phase2") + p3_cost <= budget_ms:
+            return {"phase1", "phase2", "phase3"}
+        self.latency.decay("phase2")
+        if self.phase3.uses_embeddings:
+            p3_cost += est("phase2")          # Phase 3 would pay for the encode itself
+        if spent + p3_cost <= budget_ms:
+            plan.add("phase3")
+        else:
+            self.latency.decay("phase3")
+        return plan
+
+    def _timed(self, phase: str, fn, *args):
+        t = time.perf_counter()
+        out = fn(*args)
+        self.latency.observe(phase, (time.perf_counter() - t) * 1000)
+        return out
+
+    def _analyze(self, prompt: str, deadline_ms, mode: str, phase1: Phase1Rules = None,
+                 view=None, config=None, scope=None) -> dict:
+        """
+        One admitted request. A tenant passes its own `phase1` rules, Phase 2
+        `view`, `config` (weights / thresholds) and near-dup `scope`.
+        """
         start = time.time()
+        phase1 = phase1 or self.phase1
 
         # Pre-process first
         pre = self.preprocessor.process(prompt)
         cleaned = pre["cleaned"]
 
-        # Run 3 phases on cleaned text
-        p1 = self.phase1.analyze(cleaned)
-        p2 = self.phase2.analyze(cleaned)
-        p3 = self.phase3.predict(cleaned)
+        # Near-duplicate of a recent prompt: its Phase 2 result stands in for
+        # the encode, and only subphrases it wasn't scored on are encoded.
+        # Phase 3 is skipped too if it would need the embedding or the match
+        # is a near-verbatim copy of a blocked prompt.
+        dup = sig = None
+        if self.near_dup is not None:
+            if self.phase2.index is not self._dup_index:
+                # Attack corpus changed (learned / reloaded): cached scores are stale
+                self._dup_index = self.phase2.index
+                self.near_dup.clear()
+            sig = self.near_dup.signature(cleaned)
+            dup = self.near_dup.lookup(cleaned, sig, scope)
+        if dup is not None:
+            plan = {"phase1"}
+            if not (dup["short_circuit"] or self.phase3.uses_embeddings):
+                plan.add("phase3")
+        else:
+            budget = None if deadline_ms is None else deadline_ms - (time.time() - start) * 1000
+            plan = self._plan(budget, mode)
 
-        # Weighted combination
-        risk_score = round(min(1.0,
-            0.25 * p1["score"] +
-            0.35 * p2["score"] +
-            0.40 * p3["score"]
-        ), 4)
-
-        if risk_score >= 0.45:
-            verdict = "BLOCK"
-        elif risk_score < 0.2:
-            verdict = "ALLOW"
+        # Run the planned phases on cleaned text
+        p1 = self._timed("phase1", phase1.analyze, cleaned)
+        p2 = p3 = None
+        if "phase2" in plan and self.phase3.uses_embeddings:
+            # One encoder batch serves Phase 2 similarity and Phase 3 features
+            p2, emb = self._timed("phase2", self.phase2.analyze, cleaned, True, view)
+            p3 = self._timed("phase3", self.phase3.predict, cleaned, emb)
         else:
-            verdict = "REVIEW"
+            if "phase2" in plan:
+                p2 = self._timed("phase2", self.phase2.analyze, cleaned, False, view)
+            if "phase3" in plan:
+                p3 = self._timed("phase3", self.phase3.predict, cleaned)
+
+        skipped = []
+        if dup is not None:
+            p2 = dict(dup["phase2"], reused=True,
+                      explanation=f"{dup['phase2']['explanation']} (reused from near-duplicate, "
+                                  f"similarity {dup['similarity']:.2f})")
+            # Same subphrase set analyze() scores (and add() records), so a
+            # hit never scores differently from a miss
+            phrases = self.phase2.split_subphrases(cleaned) or [cleaned]
+            unseen = self.near_dup.unseen(dup, phrases)
+            if unseen:
+                # e.g. a cached benign text with an attack sentence appended
+                sim, top = (self.phase2.score_phrases(unseen) if view is None
+                            else self.phase2.score_phrases(unseen, view.index, rows=view.rows))
+                if sim > p2["score"]:
+                    p2 = dict(self.phase2._result(sim, top), reused=False)
+                p2["explanation"] += f" (+{len(unseen)} new subphrase(s) scored)"
+        elif p2 is None:
+            skipped.append("phase2")
+            p2 = {"score": 0.0, "top_match": None, "skipped": True,
+                  "explanation": "Skipped (latency budget / load)"}
+        if p3 is None:
+            skipped.append("phase3")
+            p3 = {"score": 0.0, "skipped": True,
+                  "explanation": "Skipped (latency budget / load)"}
+
+        result = self._build_result(prompt, pre, p1, p2, p3, start, skipped, config)
+        if self.near_dup is not None:
+            if dup is not None:
+                if dup["short_circuit"] and result["verdict"] != "BLOCK":
+                    result["verdict"] = "BLOCK"
+                    result["risk_score"] = max(result["risk_score"], dup["risk_score"])
+                result["near_duplicate"] = {
+                    "similarity": dup["similarity"],
+                    "reused":     "verdict" if dup["short_circuit"] else "phase2",
+                    "verdict":    dup["verdict"],
+                }
+            else:
+                if "phase2" in plan:
+                    # The subphrases Phase 2 scored count as seen
+                    scored = self.phase2.split_subphrases(cleaned) or [cleaned]
+                    self.near_dup.add(cleaned, p2, result["verdict"], result["risk_score"], sig,
+                                      scored, scope)
+                result["near_duplicate"] = None
+        return result
+
+    def analyze_batch(self, prompts: list[str]) -> list[dict]:
+        """
+        analyze() for many prompts at once: Phase 2 encodes all subphrases
+        in one batch and Phase 3 vectorizes the whole batch. latency_ms is
+        the per-prompt share of the batch time.
+        """
+        if not prompts:
+            return []
+        start = time.time()
+        pres = [self.preprocessor.process(p) for p in prompts]
+        cleaned = [pre["cleaned"] for pre in pres]
+
+        p1s = [self.phase1.analyze(c) for c in cleaned]
+        if self.phase3.uses_embeddings:
+            p2s, embs = self.phase2.analyze_batch(cleaned, return_embeddings=True)
+            p3s = self.phase3.predict_batch(cleaned, embs)
+        else:
+            p2s = self.phase2.analyze_batch(cleaned)
+            p3s = self.phase3.predict_batch(cleaned)
+
+        results = [
+            self._build_result(prompt, pre, p1, p2, p3, start)
+            for prompt, pre, p1, p2, p3 in zip(prompts, pres, p1s, p2s, p3s)
+        ]
+        latency = round((time.time() - start) * 1000 / len(prompts), 1)
+        for r in results:
+            r["latency_ms"] = latency
+        return results
+
+    def _build_result(self, prompt: str, pre: dict, p1: dict, p2: dict, p3: dict,
+                      start: float, skipped=(), config=None) -> dict:
+        """
+        Fuse phase outputs into the public result dict. Skipped phases drop
+        out of the weighted sum and the remaining weights are renormalised.
+        `config` supplies weights / thresholds in place of self (a tenant).
+        """
+        config = config or self
+        # Weighted combination
+        weights = config.weights
+        if skipped:
+            kept = [0.0 if f"phase{i + 1}" in skipped else w for i, w in enumerate(weights)]
+            total = sum(kept)
+            # Every weighted phase skipped (e.g. weights (0, .5, .5)): Phase 1
+            # always runs, so its score is the risk rather than dividing by 0
+            weights = tuple(w / total for w in kept) if total > 0 else (1.0, 0.0, 0.0)
+        risk_score = fuse_scores(p1["score"], p2["score"], p3["score"], weights)
+        verdict = verdict_for(risk_score, config.block_threshold, config.allow_threshold)
 
         # Build explanation
         reasons = []
@@ -171,14 +603,68 @@ class LLMGuardian:
             "phase2": p2,
             "phase3": p3,
             "reasons": reasons,
+            "degraded": bool(skipped) or p1.get("degraded", False),
+            "phases_skipped": list(skipped),
             "model_accuracy": self.phase3.accuracy,
             "model_f1": self.phase3.f1,
             "train_count": self.phase3.train_count,
         }
 
-    def retrain(self) -> dict:
-        """Retrain Phase 3 with feedback data."""
-        return self.phase3.retrain()
+    def stream(self, **kwargs) -> "StreamingScan":
+        """Open a stateful scan over a token stream (see streaming.py)."""
+        from streaming import StreamingScan
+        return StreamingScan(self, **kwargs)
+
+    def conversations(self, **kwargs) -> "ConversationTracker":
+        """Per-conversation, multi-turn scanning (see conversation.py)."""
+        from conversation import ConversationTracker
+        return ConversationTracker(self, **kwargs)
+
+    def retrain(self, background: bool = False):
+        """
+        Retrain Phase 3 with feedback data. The fit runs in a worker
+        process and the new model is swapped in only if shadow evaluation
+        passes. With background=True returns a Future instead of waiting.
+        """
+        future = self.phase3.retrain_async()
+
+        def _on_done(f):
+            # Cached near-duplicate verdicts came from the old model
+            if self.near_dup is not None and f.exception() is None and f.result()["swapped"]:
+                self.near_dup.clear()
+
+        future.add_done_callback(_on_done)
+        return future if background else future.result()
+
+    def reload(self, rules: bool = True, attacks: bool = True) -> dict:
+        """
+        Hot-reload rules.json and/or the attack files without a restart.
+        Each phase validates and builds its new state first, then swaps it
+        in by reference; an invalid file leaves the running version live.
+        """
+        result = {}
+        if rules:
+            try:
+                result["rules"] = self.phase1.reload()
+            except ValueError as e:
+                print(f"[Guardian] Rules reload rejected: {e}")
+                result["rules"] = {"error": str(e)}
+        if attacks:
+            try:
+                result["attacks"] = self.phase2.reload()
+            except Exception as e:
+                print(f"[Guardian] Attack reload failed: {e}")
+                result["attacks"] = {"error": str(e)}
+        return result
+
+    def watch(self, interval: float = 2.0) -> FileWatcher:
+        """Start a background watcher that reloads on file changes."""
+        if self._watcher is None:
+            callbacks = {self.phase1.path: lambda: self.reload(rules=True, attacks=False)}
+            for path in self.phase2.attack_files:
+                callbacks[path] = lambda: self.reload(rules=False, attacks=True)
+            self._watcher = FileWatcher(callbacks, interval)
+        return self._watcher.start()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,94 @@
+"""
+embedding_cache.py — LLM Guardian Sentence-Embedding Cache
+
+Text-hash → embedding store in front of the MiniLM encoder. Only texts not
+seen before are encoded; optional LRU bound and on-disk persistence (.npz)
+so Phase 3 training doesn't re-encode the whole dataset every retrain.
+"""
+
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+def text_key(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class EmbeddingCache:
+    def __init__(self, path: str = None, model_name: str = "all-MiniLM-L6-v2",
+                 max_items: int = None):
+        """
+        Args:
+            path:       .npz file to load from / save to (None = memory only).
+            model_name: stored with the file; a different model discards it.
+            max_items:  LRU bound (None = unbounded, e.g. a training set).
+        """
+        self.path = path
+        self.model_name = model_name
+        self.max_items = max_items
+        self._store: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if path and os.path.exists(path):
+            self._load()
+
+    def _load(self):
+        try:
+            with np.load(self.path, allow_pickle=False) as data:
+                if str(data["model"]) != self.model_name:
+                    return
+                for key, vec in zip(data["keys"], data["embeddings"]):
+                    self._store[str(key)] = vec
+        except Exception as e:
+            print(f"[EmbeddingCache] Ignoring unreadable cache {self.path}: {e}")
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            keys = np.array(list(self._store), dtype="<U32")
+            emb = np.stack(list(self._store.values())) if self._store else np.empty((0, 0), np.float32)
+        tmp = self.path + ".tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, keys=keys, embeddings=emb, model=np.array(self.model_name))
+        os.replace(tmp, self.path)
+
+    def encode(self, texts: list[str], encode_fn) -> np.ndarray:
+        """
+        Embeddings for `texts` (rows in order). `encode_fn(list[str])` is
+        called once, with only the texts missing from the cache.
+        """
+        keys = [text_key(t) for t in texts]
+        out = [None] * len(texts)
+        missing: dict[str, list[int]] = {}
+        with self._lock:
+            for i, key in enumerate(keys):
+                vec = self._store.get(key)
+                if vec is None:
+                    missing.setdefault(key, []).append(i)
+                else:
+                    self._store.move_to_end(key)
+                    out[i] = vec
+        self.hits += len(texts) - sum(len(v) for v in missing.values())
+        self.misses += len(missing)
+
+        if missing:
+            first = [idx[0] for idx in missing.values()]
+            fresh = encode_fn([texts[i] for i in first])
+            with self._lock:
+                for (key, idx), vec in zip(missing.items(), fresh):
+                    for i in idx:
+                        out[i] = vec
+                    self._store[key] = vec
+                if self.max_items is not None:
+                    while len(self._store) > self.max_items:
+                        self._store.popitem(last=False)
+        return np.stack(out) if out else np.empty((0, 0), np.float32)
+
+    def __len__(self) -> int:
+        return len(self._store)
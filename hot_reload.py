@@ -0,0 +1,104 @@
+"""
+hot_reload.py — LLM Guardian File Watcher
+
+Polls rules.json / attacks.txt (or any files) for changes and triggers a
+reload callback on a background thread, so new rules ship without a
+restart. Polling keeps it dependency-free and works on Streamlit Cloud.
+
+Writers that keep the live state in sync themselves (bulk import with
+encoding, learner approvals) wrap their writes in `owned_writes(path)`;
+watchers in the same process then don't reload for them.
+"""
+
+import os
+import threading
+from contextlib import contextmanager
+
+
+def _signature(path: str):
+    """(mtime_ns, size) of a file, or None if it doesn't exist."""
+    try:
+        st = os.stat(path)
+        return (st.st_mtime_ns, st.st_size)
+    except FileNotFoundError:
+        return None
+
+
+_owned_active: dict[str, int] = {}      # abspath → open owned_writes() sections
+_owned_result: dict[str, tuple] = {}    # abspath → signature when the last one ended
+_owned_lock = threading.Lock()
+
+
+@contextmanager
+def owned_writes(path: str):
+    """
+    Mark writes to `path` inside the block as already applied in memory.
+    Watchers skip the file while the block runs and don't fire for the
+    signature it has at the end; a change by anyone else after that (or
+    mixed in — the next reload re-reads the whole file) still reloads.
+    """
+    key = os.path.abspath(path)
+    with _owned_lock:
+        _owned_active[key] = _owned_active.get(key, 0) + 1
+    try:
+        yield
+    finally:
+        with _owned_lock:
+            _owned_active[key] -= 1
+            if not _owned_active[key]:
+                del _owned_active[key]
+            _owned_result[key] = _signature(path)
+
+
+class FileWatcher:
+    """
+    Background poller. `callbacks` maps a file path to a zero-argument
+    function called (on the watcher thread) whenever that file changes.
+    Exceptions raised by a callback are logged and swallowed — a bad
+    file must never take the watcher, or the process, down.
+    """
+
+    def __init__(self, callbacks: dict, interval: float = 2.0):
+        self.callbacks = dict(callbacks)
+        self.interval = interval
+        self._seen = {path: _signature(path) for path in self.callbacks}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def poll(self) -> list[str]:
+        """Check every file once; returns the paths whose callback ran."""
+        fired = []
+        for path, callback in self.callbacks.items():
+            sig = _signature(path)
+            if sig == self._seen[path]:
+                continue
+            key = os.path.abspath(path)
+            with _owned_lock:
+                if key in _owned_active:
+                    continue                  # mid-write; look again afterwards
+                owned = _owned_result.get(key) == sig
+            self._seen[path] = sig
+            if owned:
+                continue
+            try:
+                callback()
+                fired.append(path)
+            except Exception as e:
+                print(f"[HotReload] Reload for {path} failed, keeping previous version: {e}")
+        return fired
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.poll()
+
+    def start(self) -> "FileWatcher":
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="guardian-hot-reload", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 1)
@@ -1,33 +1,109 @@
 import json
 import re
 
-def load_rules(path="rules.json"):
+from rule_safety import SafeRule
+
+RULES_FILE = "rules.json"
+
+def load_rules(path=RULES_FILE):
     with open(path, "r", encoding="utf-8") as f:
         return json.load(f)
 
+def compile_rules(rules) -> tuple:
+    """
+    Validate and compile a rule list. Raises ValueError (and nothing else)
+    on the first bad rule so a broken rules.json never replaces a working
+    rule set.
+    """
+    if not isinstance(rules, list):
+        raise ValueError("rules file must contain a JSON list")
+    compiled = []
+    for i, rule in enumerate(rules):
+        if not isinstance(rule, dict) or not {"pattern", "risk", "name"} <= rule.keys():
+            raise ValueError(f"rule #{i} needs 'pattern', 'risk' and 'name'")
+        if not isinstance(rule["name"], str) or not rule["name"]:
+            raise ValueError(f"rule #{i} needs a non-empty string 'name'")
+        if not isinstance(rule["pattern"], str) or not rule["pattern"]:
+            raise ValueError(f"rule '{rule['name']}' needs a non-empty string 'pattern'")
+        risk = rule["risk"]
+        if isinstance(risk, bool) or not isinstance(risk, (int, float)) or not 0.0 <= risk <= 1.0:
+            raise ValueError(f"rule '{rule['name']}' has risk outside [0, 1]")
+        try:
+            compiled.append(SafeRule(rule))
+        except re.error as e:
+            raise ValueError(f"rule '{rule['name']}' has an invalid pattern: {e}") from e
+        except Exception as e:
+            raise ValueError(f"rule '{rule['name']}' failed to compile: {e!r}") from e
+    return tuple(compiled)
+
 class Phase1Rules:
-    def __init__(self):
-        self.rules = load_rules()
+    def __init__(self, path=RULES_FILE):
+        self.path = path
+        self.rules = load_rules(path)
+        # Compile once; SafeRule guards backtracking-prone patterns
+        self._compiled = compile_rules(self.rules)
+        self._warn_risky(self._compiled)
+
+    def _warn_risky(self, compiled):
+        for rule in compiled:
+            if rule.audit["level"] in ("polynomial", "exponential"):
+                fallback = "linear fallback" if rule.chain else "windowed fallback"
+                print(f"[Phase1] Rule '{rule.name}' risks catastrophic backtracking "
+                      f"({rule.audit['reason']}) — {fallback} on long input.")
+
+    def reload(self) -> dict:
+        """
+        Re-read, validate and compile the rules file, then swap it in by
+        reference. Raises ValueError (old rules stay live) if it's invalid.
+        """
+        try:
+            rules = load_rules(self.path)
+        except (OSError, json.JSONDecodeError) as e:
+            raise ValueError(f"cannot read {self.path}: {e}") from e
+        compiled = compile_rules(rules)
+        self._warn_risky(compiled)
+        self._compiled, self.rules = compiled, rules
+        print(f"[Phase1] Reloaded {len(compiled)} rules from {self.path}.")
+        return {"rules": len(compiled)}
 
     def analyze(self, prompt: str) -> dict:
         prompt_lower = prompt.lower()
         matches = []
         total_risk = 0.0
+        degraded = False
 
-        for rule in self.rules:
-            if re.search(rule["pattern"], prompt_lower, re.IGNORECASE):
-                matches.append(rule["name"])
-                total_risk += rule["risk"]
+        for rule in self._compiled:     # tuple snapshot — safe across reloads
+            hit, rule_degraded = rule.search(prompt_lower)
+            degraded = degraded or rule_degraded
+            if hit:
+                matches.append(rule.name)
+                total_risk += rule.risk
 
-        # Use highest-risk match, boosted slightly for each additional match
-        score = min(1.0, total_risk * (1 + 0.15 * (len(matches) - 1))) if matches else 0.0
+        score = self._combine(total_risk, len(matches))
 
         return {
             "score": round(score, 3),
             "matches": matches,
+            "degraded": degraded,
             "explanation": f"{len(matches)} rule(s) matched: {', '.join(matches)}" if matches else "No patterns matched"
         }
 
+    @staticmethod
+    def _combine(total_risk: float, n_matches: int) -> float:
+        # Use highest-risk match, boosted slightly for each additional match
+        return min(1.0, total_risk * (1 + 0.15 * (n_matches - 1))) if n_matches else 0.0
+
+    def score_matches(self, matches) -> float:
+        """Phase 1 score for a set of rule names (e.g. accumulated over a stream)."""
+        risks = {rule.name: rule.risk for rule in self._compiled}
+        matched = [name for name in matches if name in risks]
+        return round(self._combine(sum(risks[n] for n in matched), len(matched)), 3)
+
+    def rule_stats(self) -> list[dict]:
+        """Per-rule cost profile, most expensive (total time) first."""
+        return sorted((r.stats() for r in self._compiled),
+                      key=lambda s: s["avg_ms"] * s["calls"], reverse=True)
+
 
 if __name__ == "__main__":
     engine = Phase1Rules()
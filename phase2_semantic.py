@@ -3,72 +3,248 @@ phase2_semantic.py — LLM Guardian Phase 2: Semantic Similarity Engine
 
 Pure numpy cosine similarity — zero SQLite / ChromaDB dependency.
 Works on Streamlit Cloud (Python 3.13) without any workarounds.
-Supports live hot-loading of new attack patterns via add_attacks().
+Supports live hot-loading of new attack patterns via add_attacks(), and
+zero-downtime reloads of the attack files via reload().
+
+With span_pooling=True each prompt takes ONE transformer pass: subphrase
+vectors are mean-pooled from the token embeddings over each subphrase's
+character span, and the whole-prompt vector comes from the same pass.
 """
 
+import os
 import re
+import threading
+from typing import NamedTuple
+
 import numpy as np
 from sentence_transformers import SentenceTransformer
 
 ATTACKS_FILE = "attacks.txt"
 LEARNED_FILE = "learned_attacks.txt"
+SUBPHRASE_SPLIT = r"[.!?;,]"
+
+
+class AttackIndex(NamedTuple):
+    """
+    Immutable snapshot of the attack corpus. Writers build a new one and
+    swap `Phase2Semantic._index` by reference, so a request that grabbed
+    the old snapshot always sees phrases and embeddings that line up.
+    """
+    phrases: list
+    embeddings: np.ndarray
+    rows: dict                 # phrase → row in embeddings
+    default_rows: np.ndarray = None   # rows analyze() matches by default; None = all
+
+
+class AttackView(NamedTuple):
+    """
+    A subset of one AttackIndex snapshot (e.g. one tenant's corpus): the
+    rows it may match. Views share the snapshot's embedding matrix.
+    """
+    index: AttackIndex
+    rows: np.ndarray
+
+
+EMPTY_INDEX = AttackIndex([], np.empty((0, 384), dtype=np.float32), {})
+
+
+def subphrase_spans(text: str, limit: int = 5) -> list[tuple]:
+    """(start, end) character spans of the phrases split_subphrases returns."""
+    spans, pos = [], 0
+    for m in [*re.finditer(SUBPHRASE_SPLIT, text), None]:
+        end = m.start() if m else len(text)
+        piece = text[pos:end]
+        stripped = piece.strip()
+        if len(stripped) > 5:
+            start = pos + len(piece) - len(piece.lstrip())
+            spans.append((start, start + len(stripped)))
+        if m:
+            pos = m.end()
+    return spans[:limit] if limit else spans
+
+
+def _l2_normalize(x: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(x, axis=-1, keepdims=True)
+    return x / np.maximum(norms, 1e-12)
+
+
+def read_attack_file(path: str, missing_ok: bool = True) -> list[str]:
+    """
+    Non-empty, non-comment lines of an attack file ([] if missing). With
+    missing_ok=False a missing or unreadable file raises ValueError instead,
+    so a reload never mistakes a file mid-deploy for an empty corpus.
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return [
+                line.strip() for line in f
+                if line.strip() and not line.strip().startswith("#")
+            ]
+    except FileNotFoundError as e:
+        if missing_ok:
+            return []
+        raise ValueError(f"cannot read {path}: {e}") from e
+    except (OSError, UnicodeDecodeError) as e:
+        if missing_ok:
+            raise
+        raise ValueError(f"cannot read {path}: {e}") from e
+
+
+def is_learned_file(path: str) -> bool:
+    """learned_attacks.txt may legitimately not exist yet."""
+    return os.path.basename(path) == os.path.basename(LEARNED_FILE)
 
 
 class Phase2Semantic:
-    def __init__(self):
+    def __init__(self, attack_files: tuple = (ATTACKS_FILE, LEARNED_FILE),
+                 span_pooling: bool = False):
         print("[Phase2] Loading sentence-transformer model...")
         self.model = SentenceTransformer("all-MiniLM-L6-v2")
+        self.span_pooling = span_pooling
 
-        self._attacks: list[str] = []                          # stored phrases
-        self._embeddings: np.ndarray = np.empty((0, 384), dtype=np.float32)
+        self.attack_files = tuple(attack_files)
+        self._index: AttackIndex = EMPTY_INDEX
+        self._runtime: list[str] = []        # added live via add_attacks()
+        self._extra: dict[str, list[str]] = {}   # owner → phrases outside the default corpus
+        self._extra_only: set[str] = set()   # indexed only because an owner needs them
+        self._write_lock = threading.Lock()
 
         # Load static + previously learned attacks
-        self._load_file(ATTACKS_FILE)
-        self._load_file(LEARNED_FILE)
+        for path in self.attack_files:
+            self._load_file(path)
 
         print(f"[Phase2] {len(self._attacks)} attack fingerprints loaded.")
 
+    @property
+    def index(self) -> AttackIndex:
+        """Current attack snapshot; replaced (never mutated) on every change."""
+        return self._index
+
+    @property
+    def _attacks(self) -> list[str]:
+        return self._index.phrases
+
+    @property
+    def _embeddings(self) -> np.ndarray:
+        return self._index.embeddings
+
     # ──────────────────────────────────────────────────────────────────────────
     # Internal helpers
     # ──────────────────────────────────────────────────────────────────────────
 
-    def _read_file(self, path: str) -> list[str]:
-        try:
-            with open(path, "r", encoding="utf-8") as f:
-                return [
-                    line.strip() for line in f
-                    if line.strip() and not line.strip().startswith("#")
-                ]
-        except FileNotFoundError:
-            return []
+    def _read_file(self, path: str, missing_ok: bool = True) -> list[str]:
+        return read_attack_file(path, missing_ok)
 
     def _load_file(self, path: str):
         phrases = self._read_file(path)
         if phrases:
-            self._encode_and_append(phrases)
+            with self._write_lock:
+                self._add_default(phrases)
 
-    def _encode_and_append(self, phrases: list[str]):
-        """Encode phrases and append to the in-memory embedding matrix."""
-        new_emb = self.model.encode(
+    def _encode(self, phrases: list[str]) -> np.ndarray:
+        return self.model.encode(
             phrases,
             batch_size=64,
             show_progress_bar=False,
             normalize_embeddings=True,   # L2-normalised → cosine = dot product
         )
-        if self._embeddings.shape[0] == 0:
-            self._embeddings = new_emb
-        else:
-            self._embeddings = np.vstack([self._embeddings, new_emb])
-        self._attacks.extend(phrases)
 
-    def _cosine_similarity(self, query_emb: np.ndarray) -> np.ndarray:
+    def _encode_spans(self, prompts: list[str], spans: list[list[tuple]], batch_size: int = 64):
+        """
+        One transformer pass per prompt. Returns (per-prompt arrays of span
+        vectors, whole-prompt vectors), all L2-normalised. Token vectors
+        are mean-pooled over each character span; spans cut off by
+        truncation (max_seq_length) fall back to encoding the phrase alone.
+        """
+        import torch
+
+        tokenizer = self.model.tokenizer
+        span_vecs, prompt_vecs, fallback = [], [], []
+        for b in range(0, len(prompts), batch_size):
+            batch = prompts[b:b + batch_size]
+            enc = tokenizer(batch, padding=True, truncation=True, return_tensors="pt",
+                            max_length=self.model.max_seq_length, return_offsets_mapping=True)
+            offsets = enc.pop("offset_mapping").numpy()
+            mask = enc["attention_mask"].numpy().astype(bool)
+            with torch.no_grad():
+                out = self.model({k: v.to(self.model.device) for k, v in enc.items()})
+            tokens = out["token_embeddings"].float().cpu().numpy()
+            prompt_vecs.append(out["sentence_embedding"].float().cpu().numpy())
+
+            for i, prompt_spans in enumerate(spans[b:b + batch_size]):
+                starts, ends = offsets[i, :, 0], offsets[i, :, 1]
+                real = mask[i] & (ends > starts)            # drops [CLS] / [SEP] / padding
+                covered = int(ends[real].max()) if real.any() else 0
+                vecs = np.zeros((len(prompt_spans), tokens.shape[2]), dtype=np.float32)
+                for j, (s, e) in enumerate(prompt_spans):
+                    sel = real & (starts >= s) & (ends <= e)
+                    if e <= covered and sel.any():
+                        vecs[j] = tokens[i, sel].mean(axis=0)
+                    else:
+                        fallback.append((b + i, j))
+                span_vecs.append(vecs)
+
+        if fallback:
+            texts = [prompts[i][spans[i][j][0]:spans[i][j][1]] for i, j in fallback]
+            for (i, j), vec in zip(fallback, self._encode(texts)):
+                span_vecs[i][j] = vec
+        return [_l2_normalize(v) for v in span_vecs], _l2_normalize(np.vstack(prompt_vecs))
+
+    def _publish(self, phrases: list[str], embeddings: np.ndarray, rows: dict):
+        """Swap in a new snapshot. Callers hold _write_lock."""
+        default_rows = None
+        if self._extra_only:
+            default_rows = np.fromiter((i for i, p in enumerate(phrases) if p not in self._extra_only),
+                                       dtype=np.int32)
+        self._index = AttackIndex(phrases, embeddings, rows, default_rows)
+
+    def _append(self, phrases: list[str], new_emb: np.ndarray):
+        """
+        Publish a new index with phrases appended.
+        Callers hold _write_lock and pass only phrases not yet indexed.
+        """
+        old = self._index
+        rows = dict(old.rows)
+        for i, phrase in enumerate(phrases, start=len(old.phrases)):
+            rows[phrase] = i
+        embeddings = new_emb if old.embeddings.shape[0] == 0 else np.vstack([old.embeddings, new_emb])
+        self._publish(old.phrases + phrases, embeddings, rows)
+
+    def _add_default(self, phrases: list[str], embeddings: np.ndarray = None) -> list[str]:
+        """
+        Add phrases to the default corpus, encoding those not indexed yet
+        (or taking their rows from `embeddings`, aligned with `phrases`).
+        Callers hold _write_lock. Returns the newly indexed phrases.
+        """
+        old = self._index
+        keep, seen, promoted = [], set(), False
+        for i, p in enumerate(phrases):
+            if not p or p in seen:
+                continue
+            seen.add(p)
+            if p in self._extra_only:
+                self._extra_only.discard(p)       # an owner's phrase joins the default corpus
+                promoted = True
+            elif p not in old.rows:
+                keep.append(i)
+        new = [phrases[i] for i in keep]
+        if new:
+            new_emb = (self._encode(new) if embeddings is None
+                       else np.asarray(embeddings, dtype=np.float32)[keep])
+            self._append(new, new_emb)
+        elif promoted:
+            self._publish(old.phrases, old.embeddings, old.rows)
+        return new
+
+    def _cosine_similarity(self, query_emb: np.ndarray, index: AttackIndex = None) -> np.ndarray:
         """
         Cosine similarity between a single normalised query vector
         and all pre-normalised attack embeddings → shape (n_attacks,).
         """
-        if self._embeddings.shape[0] == 0:
+        index = index or self._index
+        if index.embeddings.shape[0] == 0:
             return np.array([])
-        return self._embeddings @ query_emb  # dot product of L2-normed vecs = cosine
+        return index.embeddings @ query_emb  # dot product of L2-normed vecs = cosine
 
     # ──────────────────────────────────────────────────────────────────────────
     # Public API used by attack_learner.py
@@ -79,44 +255,226 @@ class Phase2Semantic:
         Live-add new attack fingerprints — takes effect immediately,
         no restart needed. Deduplicates against existing entries.
         """
-        existing = set(self._attacks)
-        new = [p for p in phrases if p and p not in existing]
+        with self._write_lock:
+            new = self._add_default(phrases)
+            self._runtime.extend(new)
         if new:
-            self._encode_and_append(new)
             print(f"[Phase2] Hot-loaded {len(new)} new attack fingerprints.")
 
+    def add_encoded(self, phrases: list[str], embeddings: np.ndarray) -> int:
+        """
+        Publish phrases whose (normalised) embeddings the caller already
+        computed, e.g. a bulk import encoding batch by batch. Phrases
+        already indexed are skipped. Not recorded as runtime phrases: the
+        caller persists them to an attack file. Returns the number added.
+        """
+        with self._write_lock:
+            return len(self._add_default(phrases, embeddings))
+
+    def set_extra(self, owner: str, phrases: list[str]) -> int:
+        """
+        Keep `phrases` indexed for `owner` (e.g. one tenant, matched through
+        an AttackView) without adding them to the default corpus that
+        analyze() matches. Replaces the owner's previous set; phrases no
+        longer needed by anyone are compacted out. Returns the number encoded.
+        """
+        phrases = list(dict.fromkeys(p for p in phrases if p))
+        with self._write_lock:
+            previous = self._extra.get(owner, [])
+            self._extra[owner] = phrases
+            rows = self._index.rows
+            new = [p for p in phrases if p not in rows]
+            if new:
+                self._extra_only.update(new)
+                self._append(new, self._encode(new))
+            self._compact(set(previous).difference(phrases))
+        return len(new)
+
+    def drop_extra(self, owner: str):
+        """Forget an owner's phrases; rows only it needed are removed."""
+        with self._write_lock:
+            self._compact(set(self._extra.pop(owner, ())))
+
+    def _compact(self, candidates: set):
+        """Remove rows of `candidates` no owner or default file still needs."""
+        stale = candidates & self._extra_only
+        if stale:
+            for phrases in self._extra.values():
+                stale.difference_update(phrases)
+        if not stale:
+            return
+        old = self._index
+        keep = [i for i, p in enumerate(old.phrases) if p not in stale]
+        phrases = [old.phrases[i] for i in keep]
+        self._extra_only -= stale
+        self._publish(phrases, old.embeddings[keep], {p: i for i, p in enumerate(phrases)})
+
+    def reload(self) -> dict:
+        """
+        Re-read the attack files and atomically swap in a rebuilt index.
+        Only lines not already indexed are encoded; phrases added live via
+        add_attacks() and owners' set_extra() phrases are kept. Requests in
+        flight finish on the old index. Raises ValueError (old index stays
+        live) if a configured attack file is missing or unreadable; only
+        learned_attacks.txt may be absent.
+        """
+        wanted = []
+        for path in self.attack_files:
+            wanted.extend(self._read_file(path, missing_ok=is_learned_file(path)))
+        with self._write_lock:
+            old = self._index
+            wanted = list(dict.fromkeys(wanted + self._runtime))
+            default = set(wanted)
+            for phrases in self._extra.values():
+                wanted.extend(p for p in phrases if p not in default)
+            wanted = list(dict.fromkeys(wanted))
+            self._extra_only = set(wanted).difference(default)
+
+            missing = [p for p in wanted if p not in old.rows]
+            fresh = self._encode(missing) if missing else None
+            fresh_rows = {p: i for i, p in enumerate(missing)}
+
+            embeddings = np.empty((len(wanted), old.embeddings.shape[1]), dtype=np.float32)
+            for i, phrase in enumerate(wanted):
+                if phrase in fresh_rows:
+                    embeddings[i] = fresh[fresh_rows[phrase]]
+                else:
+                    embeddings[i] = old.embeddings[old.rows[phrase]]
+            self._publish(wanted, embeddings, {p: i for i, p in enumerate(wanted)})
+
+        removed = len(old.phrases) - (len(wanted) - len(missing))
+        print(f"[Phase2] Reloaded attacks: {len(wanted)} total, "
+              f"{len(missing)} encoded, {removed} removed.")
+        return {"attacks": len(wanted), "encoded": len(missing), "removed": removed}
+
     def get_collection_size(self) -> int:
-        return len(self._attacks)
+        """Phrases in the default corpus (owners' extra phrases excluded)."""
+        return len(self._attacks) - len(self._extra_only)
+
+    def has_attack(self, phrase: str) -> bool:
+        """Whether `phrase` is in the default corpus."""
+        return phrase in self._index.rows and phrase not in self._extra_only
 
     # ──────────────────────────────────────────────────────────────────────────
     # Detection
     # ──────────────────────────────────────────────────────────────────────────
 
-    def analyze(self, prompt: str) -> dict:
-        subphrases = re.split(r"[.!?;,]", prompt)
-        subphrases = [p.strip() for p in subphrases if len(p.strip()) > 5][:5]
-        if not subphrases:
-            subphrases = [prompt]
+    @staticmethod
+    def split_subphrases(text: str, limit: int = 5) -> list[str]:
+        """Split on sentence/clause punctuation, keeping phrases > 5 chars."""
+        subphrases = re.split(SUBPHRASE_SPLIT, text)
+        subphrases = [p.strip() for p in subphrases if len(p.strip()) > 5]
+        return subphrases[:limit] if limit else subphrases
 
+    def score_phrases(self, phrases: list[str], index: AttackIndex = None,
+                      embeddings: np.ndarray = None, rows: np.ndarray = None) -> tuple:
+        """
+        Encode phrases in one batch (unless `embeddings` are supplied) and
+        return (max_similarity, top_match) against a single index snapshot,
+        or only its `rows` when given.
+        """
+        index = index or self._index          # one consistent snapshot per request
+        if rows is None:
+            rows = index.default_rows         # None unless owners have extra phrases
         max_similarity = 0.0
         top_match = None
+        n_attacks = index.embeddings.shape[0] if rows is None else len(rows)
+        if not phrases or n_attacks == 0:
+            return max_similarity, top_match
 
-        for phrase in subphrases:
-            emb  = self.model.encode(phrase, normalize_embeddings=True,
-                                     show_progress_bar=False)
-            sims = self._cosine_similarity(emb)
-            if sims.size == 0:
-                continue
-            idx = int(np.argmax(sims))
-            sim = float(sims[idx])
+        if embeddings is None:
+            embeddings = self._encode(phrases)
+        attack_emb = index.embeddings if rows is None else index.embeddings[rows]
+        sims = attack_emb @ embeddings.T           # (n_attacks, n_phrases)
+        for j, phrase in enumerate(phrases):
+            idx = int(np.argmax(sims[:, j]))
+            sim = float(sims[idx, j])
             if sim > max_similarity:
                 max_similarity = sim
+                matched = index.phrases[idx if rows is None else rows[idx]]
                 top_match = {
                     "phrase":     phrase[:60],
-                    "matched":    self._attacks[idx][:60],
+                    "matched":    matched[:60],
                     "similarity": round(sim, 3),
                 }
+        return max_similarity, top_match
+
+    def analyze(self, prompt: str, return_embedding: bool = False, view: AttackView = None):
+        """
+        Max similarity of the prompt's subphrases to known attacks (or to
+        the rows of `view`). With return_embedding=True the whole prompt is
+        encoded in the same batch and (result, prompt_embedding) is
+        returned for Phase 3 to reuse.
+        """
+        if not return_embedding:
+            if self.span_pooling:
+                return self.analyze_batch([prompt], view=view)[0]
+            subphrases = self.split_subphrases(prompt)
+            if not subphrases:
+                subphrases = [prompt]
+            if view is None:
+                return self._result(*self.score_phrases(subphrases))
+            return self._result(*self.score_phrases(subphrases, view.index, rows=view.rows))
+
+        result, embeddings = self.analyze_batch([prompt], return_embeddings=True, view=view)
+        return result[0], embeddings[0]
+
+    def analyze_batch(self, prompts: list[str], return_embeddings: bool = False,
+                      view: AttackView = None):
+        """
+        analyze() for many prompts: every subphrase of every prompt goes
+        through the encoder in one batched call. With return_embeddings=True
+        the whole prompts join that batch (unless a prompt is its own only
+        subphrase) and (results, prompt_embeddings) is returned.
+        """
+        index, rows = (self._index, None) if view is None else view
+        if self.span_pooling:
+            return self._analyze_pooled(prompts, return_embeddings, index, rows)
+        per_prompt = [self.split_subphrases(p) or [p] for p in prompts]
+        flat = [phrase for phrases in per_prompt for phrase in phrases]
+
+        # Row of each prompt's own embedding inside the encoder batch
+        prompt_rows, offset = [], 0
+        for prompt, phrases in zip(prompts, per_prompt):
+            if phrases == [prompt]:
+                prompt_rows.append(offset)
+            else:
+                prompt_rows.append(-1)
+            offset += len(phrases)
+        if return_embeddings:
+            for i, prompt in enumerate(prompts):
+                if prompt_rows[i] < 0:
+                    prompt_rows[i] = len(flat)
+                    flat.append(prompt)
+        embeddings = self._encode(flat) if flat else None
+
+        results, offset = [], 0
+        for phrases in per_prompt:
+            emb = embeddings[offset:offset + len(phrases)]
+            offset += len(phrases)
+            results.append(self._result(*self.score_phrases(phrases, index, emb, rows)))
+        if return_embeddings:
+            return results, embeddings[prompt_rows]
+        return results
+
+    def _analyze_pooled(self, prompts: list[str], return_embeddings: bool, index, rows):
+        """analyze_batch in span_pooling mode: one pass per prompt."""
+        spans = [subphrase_spans(p) for p in prompts]
+        span_vecs, prompt_vecs = self._encode_spans(prompts, spans)
+        results = []
+        for i, prompt in enumerate(prompts):
+            if spans[i]:
+                phrases = [prompt[s:e] for s, e in spans[i]]
+                emb = span_vecs[i]
+            else:
+                phrases, emb = [prompt], prompt_vecs[i:i + 1]
+            results.append(self._result(*self.score_phrases(phrases, index, emb, rows)))
+        if return_embeddings:
+            return results, prompt_vecs
+        return results
 
+    @staticmethod
+    def _result(max_similarity: float, top_match) -> dict:
         return {
             "score":       round(max_similarity, 3),
             "top_match":   top_match,
@@ -0,0 +1,198 @@
+"""
+probe_tracker.py — LLM Guardian Per-Session Probing Detection
+
+Tracks BLOCK / REVIEW verdicts per session (or client ID) in a time-bucketed
+sliding window, so one noisy user can't flag everyone sharing a learner and
+old blocks age out instead of counting forever.
+
+  • O(1) per event  — a fixed ring of buckets per session, running totals
+  • Bounded memory  — one small uint16 array per session, no per-event storage
+  • LRU + TTL       — idle sessions are evicted oldest-first
+"""
+
+import time
+import threading
+from array import array
+from collections import OrderedDict
+
+DEFAULT_SESSION = "default"
+
+
+class _SessionWindow:
+    """
+    Ring of per-bucket counts for one session. One uint16 array holds both
+    rings: BLOCK counts in [0, n), REVIEW counts in [n, 2n).
+    """
+
+    __slots__ = ("counts", "head", "block_total", "review_total", "last_seen")
+
+    def __init__(self, n_buckets: int, bucket: int, now: float):
+        self.counts = array("H", bytes(4 * n_buckets))
+        self.head = bucket            # absolute bucket index of the newest slot
+        self.block_total = 0
+        self.review_total = 0
+        self.last_seen = now
+
+    def advance(self, bucket: int):
+        """Slide the window forward to `bucket`, zeroing expired slots."""
+        delta = bucket - self.head
+        if delta <= 0:
+            return
+        counts = self.counts
+        n = len(counts) // 2
+        if delta >= n:
+            for i in range(2 * n):
+                counts[i] = 0
+            self.block_total = 0
+            self.review_total = 0
+        else:
+            for b in range(self.head + 1, bucket + 1):
+                i = b % n
+                self.block_total -= counts[i]
+                self.review_total -= counts[n + i]
+                counts[i] = 0
+                counts[n + i] = 0
+        self.head = bucket
+
+
+class ProbeTracker:
+    """
+    Sliding-window probing detector keyed by session ID.
+
+    A session is "probing" once its weighted block count inside the window
+    reaches `max_blocks`, where every `reviews_per_block` REVIEW verdicts
+    count as one BLOCK. Once probing, further REVIEWs from that session
+    should be escalated to BLOCK (see `should_escalate`).
+    """
+
+    def __init__(self, window_seconds: float = 60.0, bucket_seconds: float = 5.0,
+                 max_blocks: int = 3, reviews_per_block: int = 3,
+                 max_sessions: int = 1_000_000, session_ttl: float = 1800.0,
+                 clock=time.monotonic):
+        if bucket_seconds <= 0 or window_seconds < bucket_seconds:
+            raise ValueError("window_seconds must be >= bucket_seconds > 0")
+        self.bucket_seconds = float(bucket_seconds)
+        self.n_buckets = int(round(window_seconds / bucket_seconds))
+        self.max_blocks = max_blocks
+        self.reviews_per_block = max(1, reviews_per_block)
+        self.max_sessions = max_sessions
+        self.session_ttl = session_ttl
+        self._clock = clock
+        self._sessions: "OrderedDict[str, _SessionWindow]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    # ──────────────────────────────────────────────────────────────────────────
+    # Internal helpers
+    # ──────────────────────────────────────────────────────────────────────────
+
+    def _bucket(self, now: float) -> int:
+        return int(now // self.bucket_seconds)
+
+    def _evict(self, now: float):
+        """Drop sessions over capacity or idle past the TTL (oldest first)."""
+        sessions = self._sessions
+        while sessions:
+            sid, win = next(iter(sessions.items()))
+            if len(sessions) > self.max_sessions or now - win.last_seen > self.session_ttl:
+                del sessions[sid]
+            else:
+                break
+
+    def _touch(self, session_id: str, now: float) -> _SessionWindow:
+        bucket = self._bucket(now)
+        win = self._sessions.get(session_id)
+        if win is None:
+            win = _SessionWindow(self.n_buckets, bucket, now)
+            self._sessions[session_id] = win
+        else:
+            win.advance(bucket)
+            win.last_seen = now
+            self._sessions.move_to_end(session_id)
+        self._evict(now)
+        return win
+
+    def _score(self, win: _SessionWindow) -> int:
+        return win.block_total + win.review_total // self.reviews_per_block
+
+    def _status(self, win: _SessionWindow) -> dict:
+        weighted = self._score(win)
+        return {
+            "blocks":   win.block_total,
+            "reviews":  win.review_total,
+            "weighted": weighted,
+            "probing":  weighted >= self.max_blocks,
+        }
+
+    # ──────────────────────────────────────────────────────────────────────────
+    # Public API
+    # ──────────────────────────────────────────────────────────────────────────
+
+    def record(self, session_id: str, verdict: str) -> dict:
+        """
+        Record one verdict for a session. ALLOW verdicts only refresh the
+        session's LRU position. Returns the session's current window status.
+        """
+        now = self._clock()
+        with self._lock:
+            win = self._touch(session_id or DEFAULT_SESSION, now)
+            i = win.head % self.n_buckets
+            if verdict == "BLOCK" and win.counts[i] < 0xFFFF:
+                win.counts[i] += 1
+                win.block_total += 1
+            elif verdict == "REVIEW" and win.counts[self.n_buckets + i] < 0xFFFF:
+                win.counts[self.n_buckets + i] += 1
+                win.review_total += 1
+            return self._status(win)
+
+    def status(self, session_id: str) -> dict:
+        """Current window status for a session (all zeros if unknown/evicted)."""
+        now = self._clock()
+        with self._lock:
+            win = self._sessions.get(session_id or DEFAULT_SESSION)
+            if win is None or now - win.last_seen > self.session_ttl:
+                return {"blocks": 0, "reviews": 0, "weighted": 0, "probing": False}
+            win.advance(self._bucket(now))
+            return self._status(win)
+
+    def is_probing(self, session_id: str) -> bool:
+        return self.status(session_id)["probing"]
+
+    def should_escalate(self, session_id: str, verdict: str) -> bool:
+        """True if a REVIEW from this session should be treated as a BLOCK."""
+        return verdict == "REVIEW" and self.is_probing(session_id)
+
+    def forget(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id or DEFAULT_SESSION, None)
+
+    def session_count(self) -> int:
+        return len(self._sessions)
+
+
+if __name__ == "__main__":
+    import tracemalloc
+
+    # Memory per session + per-event cost at scale
+    n = 1_000_000
+    tracker = ProbeTracker(max_sessions=n)
+    tracemalloc.start()
+    base, _ = tracemalloc.get_traced_memory()
+    start = time.perf_counter()
+    for i in range(n):
+        tracker.record(f"s{i}", "BLOCK" if i % 3 else "REVIEW")
+    elapsed = time.perf_counter() - start
+    used, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print("=" * 60)
+    print(f"Sessions tracked : {tracker.session_count():,}")
+    print(f"Buckets/session  : {tracker.n_buckets}")
+    print(f"Memory/session   : {(used - base) / n:.0f} bytes (incl. session key)")
+    print(f"Insert rate      : {n / elapsed:,.0f} events/s")
+
+    start = time.perf_counter()
+    for i in range(n):
+        tracker.record(f"s{i % 1000}", "BLOCK")
+    elapsed = time.perf_counter() - start
+    print(f"Hot-session rate : {n / elapsed:,.0f} events/s")
+    print(f"s1 status        : {tracker.status('s1')}")
@@ -0,0 +1,363 @@
+"""
+rule_safety.py — LLM Guardian Rule-Safety Layer for Phase 1
+
+Python's `re` backtracks. A rule shaped like `(a|b).*(c|d).*(e|f)` is
+O(n³) on a long line full of `a`s that never contains an `f`, and a
+single pasted document can stall a worker for seconds.
+
+  1. Load-time audit   — flags rules with unbounded repeats in sequence
+                         (polynomial) or nested (exponential)
+  2. Linear fallback   — rules of the form `S1.*S2.*…|T1.*T2…` where each
+                         segment is bounded are matched greedily, segment by
+                         segment, in linear time with identical results
+  3. Runtime budget    — per-rule cost stats; slow or long-input rules switch
+                         to the fallback, undecomposable ones to windowed
+                         matching (flagged as degraded)
+"""
+
+import re
+import time
+
+try:
+    from re import _parser as sre_parse          # Python ≥ 3.11
+    from re import _constants as sre_constants
+except ImportError:                              # pragma: no cover
+    import sre_parse
+    import sre_constants
+
+MAXREPEAT = sre_constants.MAXREPEAT
+_REPEATS = (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT)
+
+
+# ─────────────────────────────────────────────
+# Static audit
+# ─────────────────────────────────────────────
+def _walk(subpattern, depth: int, stats: dict):
+    """Count unbounded repeats per sequence level and detect nesting."""
+    seq_unbounded = 0
+    for op, av in subpattern:
+        if op in _REPEATS:
+            lo, hi, body = av
+            if hi == MAXREPEAT:
+                seq_unbounded += 1
+                if depth > 0:
+                    stats["nested"] = True
+                _walk(body, depth + 1, stats)
+            else:
+                _walk(body, depth, stats)
+        elif op == sre_constants.SUBPATTERN:
+            _walk(av[-1], depth, stats)
+        elif op == sre_constants.BRANCH:
+            for branch in av[1]:
+                _walk(branch, depth, stats)
+        elif op in (sre_constants.ASSERT, sre_constants.ASSERT_NOT):
+            _walk(av[1], depth, stats)
+    stats["max_sequential"] = max(stats["max_sequential"], seq_unbounded)
+
+
+def audit_pattern(pattern: str) -> dict:
+    """
+    Classify a pattern's worst-case `re.search` cost on adversarial input:
+      safe        — no unbounded repeat
+      quadratic   — one unbounded repeat per branch (search retries every start)
+      polynomial  — k ≥ 2 unbounded repeats in sequence → O(n^(k+1))
+      exponential — an unbounded repeat nested inside another
+    """
+    stats = {"max_sequential": 0, "nested": False}
+    _walk(sre_parse.parse(pattern), 0, stats)
+    k = stats["max_sequential"]
+    if stats["nested"]:
+        level, reason = "exponential", "nested unbounded quantifier"
+    elif k >= 2:
+        level, reason = "polynomial", f"{k} unbounded repeats in sequence (O(n^{k + 1}))"
+    elif k == 1:
+        level, reason = "quadratic", "one unbounded repeat (O(n²) under search)"
+    else:
+        level, reason = "safe", "bounded"
+    return {"level": level, "unbounded": k, "reason": reason}
+
+
+# ─────────────────────────────────────────────
+# Linear-time fallback for `S1.*S2.*…` chains
+# ─────────────────────────────────────────────
+def _split_top(pattern: str, sep: str) -> list[str]:
+    """Split on `sep` at paren depth 0, outside character classes."""
+    parts, buf, depth, i, in_class = [], [], 0, 0, False
+    while i < len(pattern):
+        ch = pattern[i]
+        if ch == "\\":
+            buf.append(pattern[i:i + 2])
+            i += 2
+            continue
+        if in_class:
+            in_class = ch != "]"
+        elif ch == "[":
+            in_class = True
+        elif ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        elif depth == 0 and pattern.startswith(sep, i):
+            parts.append("".join(buf))
+            buf = []
+            i += len(sep)
+            continue
+        buf.append(ch)
+        i += 1
+    parts.append("".join(buf))
+    return parts
+
+
+def _may_match_newline(parsed, flags: int) -> bool:
+    """Conservative: True if the subpattern could consume a newline."""
+    for op, av in parsed:
+        if op == sre_constants.LITERAL and av == 10:
+            return True
+        if op == sre_constants.NOT_LITERAL and av != 10:
+            return True
+        if op == sre_constants.ANY and flags & re.DOTALL:
+            return True
+        if op == sre_constants.IN:
+            for iop, iav in av:
+                if iop in (sre_constants.NEGATE, sre_constants.CATEGORY):
+                    return True
+                if iop == sre_constants.LITERAL and iav == 10:
+                    return True
+                if iop == sre_constants.RANGE and iav[0] <= 10 <= iav[1]:
+                    return True
+        if op == sre_constants.SUBPATTERN and _may_match_newline(av[-1], flags):
+            return True
+        if op == sre_constants.BRANCH and any(_may_match_newline(b, flags) for b in av[1]):
+            return True
+        if op in _REPEATS and _may_match_newline(av[2], flags):
+            return True
+    return False
+
+
+def compile_chain(pattern: str, flags: int = 0):
+    """
+    Decompose `pattern` into branches of bounded segments joined by `.*`.
+    Returns a list of branches (each a list of (compiled, max_width) tuples),
+    or None if the pattern doesn't have that shape. Segments must not be
+    able to match a newline, so every match stays on one line.
+    """
+    if flags & re.DOTALL:
+        return None
+    branches = []
+    for branch in _split_top(pattern, "|"):
+        segments = []
+        for seg in _split_top(branch, ".*"):
+            if not seg:
+                return None
+            try:
+                parsed = sre_parse.parse(seg, flags)
+            except re.error:
+                return None
+            lo, hi = parsed.getwidth()
+            if hi >= MAXREPEAT or audit_pattern(seg)["unbounded"] \
+                    or _may_match_newline(parsed, flags):
+                return None
+            segments.append((re.compile(seg, flags), hi))
+        branches.append(segments)
+    return branches
+
+
+def _earliest_end(seg: re.Pattern, width: int, text: str, pos: int, endpos: int):
+    """End of the earliest-ending match of `seg` in text[pos:endpos], or -1."""
+    first = seg.search(text, pos, endpos)
+    if first is None:
+        return -1
+    best = first.end()
+    # Any earlier-ending match must start inside the first match's span
+    for start in range(first.start(), best):
+        for end in range(start, min(best, start + width + 1)):
+            if seg.fullmatch(text, start, end):
+                best = end
+                break
+    return best
+
+
+def chain_search(branches, text: str) -> bool:
+    """
+    Equivalent to `re.search(pattern, text)` for a compiled chain: `.`
+    never crosses a newline, so each line is scanned greedily, taking the
+    earliest-ending match of each segment in turn. Linear in len(text).
+    """
+    for line_start, line_end in _lines(text):
+        for segments in branches:
+            pos = line_start
+            for seg, width in segments:
+                pos = _earliest_end(seg, width, text, pos, line_end)
+                if pos < 0:
+                    break
+            else:
+                return True
+    return False
+
+
+def _lines(text: str):
+    start = 0
+    while True:
+        end = text.find("\n", start)
+        if end < 0:
+            yield start, len(text)
+            return
+        yield start, end
+        start = end + 1
+
+
+# ─────────────────────────────────────────────
+# Guarded rule
+# ─────────────────────────────────────────────
+class SafeRule:
+    """
+    One compiled Phase 1 rule with cost tracking.
+
+    Inputs up to `max_direct_chars` run through plain `re.search`. Longer
+    inputs, or any input once the rule has blown its time budget, run
+    through the linear chain matcher when the rule decomposes, and
+    otherwise through overlapping windows of `window_chars` per line —
+    the only path that can miss a match, reported as degraded.
+    """
+
+    def __init__(self, rule: dict, flags: int = re.IGNORECASE,
+                 max_direct_chars: int = 256, budget_ms: float = 5.0,
+                 window_chars: int = 2000):
+        self.name = rule["name"]
+        self.risk = rule["risk"]
+        self.pattern = rule["pattern"]
+        self.regex = re.compile(self.pattern, flags)
+        self.audit = audit_pattern(self.pattern)
+        self.chain = compile_chain(self.pattern, flags) if self.audit["level"] != "safe" else None
+        self.max_direct_chars = max_direct_chars
+        self.budget_ms = budget_ms
+        self.window_chars = window_chars
+        self.over_budget = False
+        # Cost stats
+        self.calls = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.fallbacks = 0
+
+    @property
+    def risky(self) -> bool:
+        return self.audit["level"] != "safe"
+
+    def _windowed(self, text: str) -> bool:
+        size = self.window_chars
+        step = max(1, size - size // 4)
+        for line_start, line_end in _lines(text):
+            if line_end - line_start <= size:
+                if self.regex.search(text, line_start, line_end):
+                    return True
+                continue
+            for start in range(line_start, line_end, step):
+                if self.regex.search(text, start, min(line_end, start + size)):
+                    return True
+        return False
+
+    def search(self, text: str, guarded: bool = False) -> tuple[bool, bool]:
+        """Returns (matched, degraded)."""
+        start = time.perf_counter()
+        degraded = False
+        if self.risky and (guarded or self.over_budget or len(text) > self.max_direct_chars):
+            self.fallbacks += 1
+            if self.chain is not None:
+                hit = chain_search(self.chain, text)
+            else:
+                hit = self._windowed(text)
+                degraded = True
+        else:
+            hit = self.regex.search(text) is not None
+            if self.risky and (time.perf_counter() - start) * 1000 > self.budget_ms:
+                self.over_budget = True
+        elapsed = (time.perf_counter() - start) * 1000
+        self.calls += 1
+        self.total_ms += elapsed
+        self.max_ms = max(self.max_ms, elapsed)
+        return hit, degraded
+
+    def stats(self) -> dict:
+        return {
+            "name":        self.name,
+            "level":       self.audit["level"],
+            "calls":       self.calls,
+            "avg_ms":      round(self.total_ms / self.calls, 3) if self.calls else 0.0,
+            "max_ms":      round(self.max_ms, 3),
+            "fallbacks":   self.fallbacks,
+            "over_budget": self.over_budget,
+        }
+
+
+# ─────────────────────────────────────────────
+# Fuzz benchmark helpers
+# ─────────────────────────────────────────────
+def _sample(parsed) -> str:
+    """Produce one short string matched by a parsed (bounded) subpattern."""
+    out = []
+    for op, av in parsed:
+        if op == sre_constants.LITERAL:
+            out.append(chr(av))
+        elif op == sre_constants.ANY:
+            out.append("x")
+        elif op == sre_constants.IN:
+            for iop, iav in av:
+                if iop == sre_constants.LITERAL:
+                    out.append(chr(iav))
+                    break
+                if iop == sre_constants.RANGE:
+                    out.append(chr(iav[0]))
+                    break
+        elif op == sre_constants.SUBPATTERN:
+            out.append(_sample(av[-1]))
+        elif op == sre_constants.BRANCH:
+            out.append(_sample(av[1][0]))
+        elif op in _REPEATS:
+            out.append(_sample(av[2]) * av[0])
+    return "".join(out)
+
+
+def adversarial_inputs(pattern: str, size: int) -> list[str]:
+    """
+    Worst-case-ish inputs: every branch's leading segments repeated up to
+    `size` chars with the final segment missing, so search must exhaust
+    every split point before failing.
+    """
+    inputs = []
+    for branch in _split_top(pattern, "|"):
+        segs = _split_top(branch, ".*")
+        if len(segs) < 2:
+            continue
+        try:
+            unit = " ".join(_sample(sre_parse.parse(s)) for s in segs[:-1]) + " "
+        except re.error:
+            continue
+        inputs.append((unit * (size // max(1, len(unit)) + 1))[:size])
+    return inputs or ["a" * size]
+
+
+if __name__ == "__main__":
+    import json
+
+    with open("rules.json", "r", encoding="utf-8") as f:
+        rules = [SafeRule(r) for r in json.load(f)]
+
+    sizes = [1_000, 4_000]
+    print("=" * 86)
+    print(f"{'rule':<24}{'level':<13}{'chain':<7}" +
+          "".join(f"{'re ' + str(s):>11}{'safe ' + str(s):>11}" for s in sizes))
+    print("-" * 86)
+    for rule in sorted(rules, key=lambda r: r.audit["unbounded"], reverse=True):
+        row = f"{rule.name[:23]:<24}{rule.audit['level']:<13}{'yes' if rule.chain else '-':<7}"
+        for size in sizes:
+            worst_re = worst_safe = 0.0
+            for text in adversarial_inputs(rule.pattern, size):
+                t = time.perf_counter()
+                expected = rule.regex.search(text) is not None
+                worst_re = max(worst_re, time.perf_counter() - t)
+                t = time.perf_counter()
+                got, _ = rule.search(text, guarded=True)
+                worst_safe = max(worst_safe, time.perf_counter() - t)
+                assert got == expected or rule.chain is None, rule.name
+            row += f"{worst_re * 1000:>9.1f}ms{worst_safe * 1000:>9.1f}ms"
+        print(row)
@@ -0,0 +1,386 @@
+"""
+tuning.py — LLM Guardian Threshold & Weight Tuning Harness
+
+Scores jailbreak_data.csv + feedback.csv through each phase ONCE, caches the
+(n_samples × 3) per-phase score matrix on disk, then sweeps fusion weights
+and BLOCK / ALLOW cutoffs as vectorised NumPy ops over that matrix.
+
+  • Per-phase fingerprints (rules.json, attack files, training data) — only
+    the column whose inputs changed is recomputed; new rows are scored for
+    Phase 1/2 without touching cached ones
+  • Phase 3 column = out-of-fold predictions (5-fold), so the ML score
+    isn't evaluated on its own training rows
+  • Reports precision / recall / F1 (BLOCK = positive), REVIEW fraction and
+    the share of attacks let through as ALLOW (allow-leak); the allow cutoff
+    is the highest one whose allow-leak stays under --max-allow-leak
+
+Usage:
+    python tuning.py                      # sweep with cached scores
+    python tuning.py --step 0.05 --max-review 0.25 --max-allow-leak 0.02 --top 10
+    python tuning.py --invalidate phase2  # force one column to recompute
+    python tuning.py --compare-phase3     # TF-IDF vs embedding Phase 3
+    python tuning.py --compare-pooling    # span-pooled vs per-phrase Phase 2
+"""
+
+import os
+import json
+import hashlib
+import argparse
+
+import numpy as np
+
+from detector import (load_training_data, make_vectorizer, make_classifier,
+                      DATA_FILE, FEEDBACK_FILE, PHASE3_FEATURES,
+                      WEIGHTS, BLOCK_THRESHOLD, ALLOW_THRESHOLD)
+from preprocessor import get_preprocessor
+from phase1_rules import RULES_FILE
+from phase2_semantic import ATTACKS_FILE, LEARNED_FILE
+
+CACHE_FILE = ".tuning_cache.npz"
+PHASES = ("phase1", "phase2", "phase3")
+
+
+def _digest(*parts) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        h.update(part if isinstance(part, bytes) else str(part).encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def _file_digest(*paths) -> str:
+    parts = []
+    for path in paths:
+        try:
+            with open(path, "rb") as f:
+                parts.append(f.read())
+        except FileNotFoundError:
+            parts.append(b"<missing>")
+    return _digest(*parts)
+
+
+def text_key(text: str) -> str:
+    return _digest(text)
+
+
+# ─────────────────────────────────────────────
+# Score cache
+# ─────────────────────────────────────────────
+class ScoreCache:
+    """
+    Per-phase score matrix keyed by text hash. `fingerprints` records what
+    each column was computed from; a mismatch invalidates just that column.
+    """
+
+    def __init__(self, path: str = CACHE_FILE):
+        self.path = path
+        self.keys = np.array([], dtype="<U32")
+        self.scores = np.empty((0, 3), dtype=np.float32)
+        self.fingerprints = {p: None for p in PHASES}
+        if os.path.exists(path):
+            with np.load(path, allow_pickle=False) as data:
+                self.keys = data["keys"]
+                self.scores = data["scores"]
+                self.fingerprints = json.loads(str(data["meta"]))
+
+    def save(self):
+        with open(self.path, "wb") as f:
+            np.savez(f, keys=self.keys, scores=self.scores,
+                     meta=np.array(json.dumps(self.fingerprints)))
+
+    @staticmethod
+    def current_fingerprints(texts: list[str], labels: list[int]) -> dict:
+        return {
+            "phase1": _file_digest(RULES_FILE),
+            "phase2": _file_digest(ATTACKS_FILE, LEARNED_FILE) + ":all-MiniLM-L6-v2",
+            # Out-of-fold scores depend on the whole training set
+            "phase3": _digest(*texts, *labels, repr(make_vectorizer()), repr(make_classifier())),
+        }
+
+    def build(self, texts: list[str], labels: list[int], invalidate=()) -> np.ndarray:
+        """Return the (n, 3) score matrix for `texts`, computing only what's stale."""
+        fps = self.current_fingerprints(texts, labels)
+        keys = np.array([text_key(t) for t in texts], dtype="<U32")
+        n = len(texts)
+
+        # Carry over cached rows by key
+        scores = np.full((n, 3), np.nan, dtype=np.float32)
+        if len(self.keys):
+            pos = {k: i for i, k in enumerate(self.keys)}
+            hit = np.array([pos.get(k, -1) for k in keys])
+            found = hit >= 0
+            scores[found] = self.scores[hit[found]]
+        for col, phase in enumerate(PHASES):
+            if self.fingerprints.get(phase) != fps[phase] or phase in invalidate:
+                scores[:, col] = np.nan
+
+        pre = get_preprocessor()
+        cleaned = None
+
+        def _cleaned():
+            nonlocal cleaned
+            if cleaned is None:
+                cleaned = [pre.process(t)["cleaned"] for t in texts]
+            return cleaned
+
+        # Phase 1 / 2 — only rows with no cached score
+        todo = np.flatnonzero(np.isnan(scores[:, 0]))
+        if len(todo):
+            from phase1_rules import Phase1Rules
+            print(f"[Tuning] Phase 1: scoring {len(todo)} / {n} rows")
+            p1 = Phase1Rules()
+            scores[todo, 0] = [p1.analyze(_cleaned()[i])["score"] for i in todo]
+
+        todo = np.flatnonzero(np.isnan(scores[:, 1]))
+        if len(todo):
+            from phase2_semantic import Phase2Semantic
+            print(f"[Tuning] Phase 2: scoring {len(todo)} / {n} rows")
+            p2 = Phase2Semantic()
+            batch = [_cleaned()[i] for i in todo]
+            scores[todo, 1] = [r["score"] for r in p2.analyze_batch(batch)]
+
+        # Phase 3 — out-of-fold, always the full column
+        if np.isnan(scores[:, 2]).any():
+            from sklearn.pipeline import make_pipeline
+            from sklearn.model_selection import cross_val_predict, StratifiedKFold
+            print(f"[Tuning] Phase 3: 5-fold out-of-fold scoring of {n} rows")
+            pipe = make_pipeline(make_vectorizer(), make_classifier())
+            folds = StratifiedKFold(n_splits=5, shuffle=True, random_state=42)
+            scores[:, 2] = cross_val_predict(pipe, _cleaned(), labels, cv=folds,
+                                             method="predict_proba")[:, 1]
+
+        self.keys, self.scores, self.fingerprints = keys, scores, fps
+        self.save()
+        return scores
+
+
+# ─────────────────────────────────────────────
+# Vectorised sweep
+# ─────────────────────────────────────────────
+def weight_grid(step: float = 0.05) -> np.ndarray:
+    """All (w1, w2, w3) on the simplex with the given step → shape (k, 3)."""
+    m = int(round(1 / step))
+    grid = [(i, j, m - i - j) for i in range(m + 1) for j in range(m + 1 - i)]
+    return np.array(grid, dtype=np.float32) / m
+
+
+def sweep(scores: np.ndarray, labels, weights: np.ndarray,
+          block: np.ndarray, allow: np.ndarray) -> dict:
+    """
+    Evaluate every (weights, block, allow) combination at once.
+    Returns arrays shaped (k, b) for precision/recall/F1, (k, b, a) for
+    the REVIEW fraction (NaN where allow ≥ block) and (k, a) for
+    allow_leak, the fraction of attacks scored below the allow cutoff.
+    """
+    y = np.asarray(labels, dtype=bool)
+    n = len(y)
+    risk = np.minimum(scores @ weights.T, 1.0)                     # (n, k)
+    blocked = risk[:, :, None] >= block[None, None, :]            # (n, k, b)
+
+    tp = np.einsum("n,nkb->kb", y.astype(np.int32), blocked.astype(np.int32))
+    n_blocked = blocked.sum(axis=0)
+    precision = np.divide(tp, n_blocked, out=np.zeros(tp.shape), where=n_blocked > 0)
+    recall = tp / max(int(y.sum()), 1)
+    f1 = np.divide(2 * precision * recall, precision + recall,
+                   out=np.zeros(tp.shape), where=(precision + recall) > 0)
+
+    # REVIEW = allow ≤ risk < block  →  count(risk < block) − count(risk < allow)
+    below_block = (n - n_blocked)                                  # (k, b)
+    below_allow = (risk[:, :, None] < allow[None, None, :]).sum(axis=0)   # (k, a)
+    review = (below_block[:, :, None] - below_allow[:, None, :]) / n
+    review = np.where(allow[None, None, :] < block[None, :, None], review, np.nan)
+
+    below_allow_attacks = np.einsum("n,nka->ka", y.astype(np.int32),
+                                    (risk[:, :, None] < allow[None, None, :]).astype(np.int32))
+    allow_leak = below_allow_attacks / max(int(y.sum()), 1)
+
+    return {"precision": precision, "recall": recall, "f1": f1, "review": review,
+            "allow_leak": allow_leak}
+
+
+def best_configs(result: dict, weights, block, allow, max_review: float,
+                 max_allow_leak: float, top: int) -> list[dict]:
+    """
+    Top configs by F1. For each (weights, block) the allow cutoff is the
+    one with least REVIEW among those letting at most `max_allow_leak` of
+    attacks through as ALLOW; the config qualifies if that REVIEW ≤ max_review.
+    """
+    leak = result["allow_leak"]                                    # (k, a)
+    review = np.where(np.isnan(result["review"]) | (leak[:, None, :] > max_allow_leak),
+                      np.inf, result["review"])
+    a_best = np.argmin(review, axis=2)                             # (k, b)
+    r_best = np.take_along_axis(review, a_best[:, :, None], axis=2)[:, :, 0]
+    leak_best = np.take_along_axis(leak, a_best, axis=1)           # (k, b)
+    f1 = np.where(r_best <= max_review, result["f1"], -1.0)
+    order = np.argsort(f1, axis=None)[::-1][:top]
+    rows = []
+    for flat in order:
+        k, b = np.unravel_index(flat, f1.shape)
+        if f1[k, b] < 0:
+            break
+        rows.append({
+            "weights":   tuple(round(float(w), 3) for w in weights[k]),
+            "block":     round(float(block[b]), 3),
+            "allow":     round(float(allow[a_best[k, b]]), 3),
+            "precision": round(float(result["precision"][k, b]), 3),
+            "recall":    round(float(result["recall"][k, b]), 3),
+            "f1":        round(float(result["f1"][k, b]), 3),
+            "review":    round(float(r_best[k, b]), 3),
+            "allow_leak": round(float(leak_best[k, b]), 3),
+        })
+    return rows
+
+
+# ─────────────────────────────────────────────
+# Phase 3 feature comparison
+# ─────────────────────────────────────────────
+def compare_phase3(n_requests: int = 200) -> list[dict]:
+    """
+    Train Phase 3 in every feature mode (identical fixed holdout)
+    and time the combined Phase 2 + Phase 3 cost per request — the part
+    that changes when Phase 3 reuses Phase 2's embedding.
+    """
+    import time
+    from detector import Phase3ML
+    from phase2_semantic import Phase2Semantic
+
+    phase2 = Phase2Semantic()
+    texts, _ = load_training_data()
+    pre = get_preprocessor()
+    sample = [pre.process(t)["cleaned"] for t in texts[:n_requests]]
+
+    rows = []
+    for features in PHASE3_FEATURES:
+        phase3 = Phase3ML(features, encoder=phase2)
+        start = time.perf_counter()
+        for prompt in sample:
+            if phase3.uses_embeddings:
+                _, emb = phase2.analyze(prompt, return_embedding=True)
+                phase3.predict(prompt, emb)
+            else:
+                phase2.analyze(prompt)
+                phase3.predict(prompt)
+        per_request = (time.perf_counter() - start) * 1000 / len(sample)
+        rows.append({"features": features, "accuracy": phase3.accuracy,
+                     "f1": phase3.f1, "p2_p3_ms": round(per_request, 2)})
+    return rows
+
+
+# ─────────────────────────────────────────────
+# Phase 2 encoding comparison
+# ─────────────────────────────────────────────
+def compare_pooling(n_requests: int = 300) -> list[dict]:
+    """
+    Phase 2 scores with per-phrase encoding (one pass per subphrase) vs
+    span pooling (one pass per prompt) on jailbreak_data.csv and, as
+    prompts, attacks.txt itself. Reports agreement and ms per prompt.
+    """
+    import time
+    from phase2_semantic import Phase2Semantic, read_attack_file
+
+    phase2 = Phase2Semantic()
+    texts, _ = load_training_data()
+    pre = get_preprocessor()
+    datasets = {
+        DATA_FILE:    [pre.process(t)["cleaned"] for t in texts[:n_requests]],
+        ATTACKS_FILE: read_attack_file(ATTACKS_FILE)[:n_requests],
+    }
+
+    rows = []
+    for name, prompts in datasets.items():
+        runs = {}
+        for pooled in (False, True):
+            phase2.span_pooling = pooled
+            phase2.analyze(prompts[0])                        # warm-up
+            start = time.perf_counter()
+            results = [phase2.analyze(p) for p in prompts]
+            runs[pooled] = ((time.perf_counter() - start) * 1000 / len(prompts), results)
+        phase2.span_pooling = False
+
+        base = np.array([r["score"] for r in runs[False][1]])
+        pooled = np.array([r["score"] for r in runs[True][1]])
+        same_match = np.mean([
+            (a["top_match"] or {}).get("matched") == (b["top_match"] or {}).get("matched")
+            for a, b in zip(runs[False][1], runs[True][1])
+        ])
+        # Same side of 0.5 — Phase 2's own "semantically similar" reason cutoff
+        same_side = np.mean((base > 0.5) == (pooled > 0.5))
+        rows.append({
+            "dataset":      name,
+            "prompts":      len(prompts),
+            "pearson":      round(float(np.corrcoef(base, pooled)[0, 1]), 3),
+            "mean_abs_diff": round(float(np.abs(base - pooled).mean()), 3),
+            "same_match":   round(float(same_match), 3),
+            "same_side":    round(float(same_side), 3),
+            "phrase_ms":    round(runs[False][0], 2),
+            "pooled_ms":    round(runs[True][0], 2),
+            "speedup":      round(runs[False][0] / runs[True][0], 2),
+        })
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sweep LLM Guardian fusion weights and cutoffs.")
+    parser.add_argument("--step", type=float, default=0.05, help="weight grid step")
+    parser.add_argument("--max-review", type=float, default=0.30, help="max REVIEW fraction")
+    parser.add_argument("--max-allow-leak", type=float, default=0.02,
+                        help="max fraction of attacks scored ALLOW")
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--invalidate", nargs="*", default=(), choices=PHASES)
+    parser.add_argument("--cache", default=CACHE_FILE)
+    parser.add_argument("--compare-phase3", action="store_true",
+                        help="compare Phase 3 feature modes instead of sweeping")
+    parser.add_argument("--compare-pooling", action="store_true",
+                        help="compare span-pooled vs per-phrase Phase 2 encoding")
+    args = parser.parse_args(argv)
+
+    if args.compare_pooling:
+        rows = compare_pooling()
+        print("=" * 92)
+        print(f"{'dataset':<20}{'n':>5}{'pearson':>9}{'|Δ| mean':>10}{'same top':>10}"
+              f"{'same >0.5':>11}{'phrase ms':>11}{'pooled ms':>11}{'speedup':>9}")
+        for r in rows:
+            print(f"{r['dataset']:<20}{r['prompts']:>5}{r['pearson']:>9.3f}{r['mean_abs_diff']:>10.3f}"
+                  f"{r['same_match']:>10.1%}{r['same_side']:>11.1%}{r['phrase_ms']:>11.2f}"
+                  f"{r['pooled_ms']:>11.2f}{r['speedup']:>8.2f}×")
+        return
+
+    if args.compare_phase3:
+        rows = compare_phase3()
+        print("=" * 60)
+        print(f"{'features':<18}{'accuracy':>10}{'F1':>8}{'P2+P3 ms/req':>16}")
+        for row in rows:
+            print(f"{row['features']:<18}{row['accuracy']:>9.1f}%{row['f1']:>7.1f}%{row['p2_p3_ms']:>16.2f}")
+        return
+
+    texts, labels = load_training_data()
+    print(f"[Tuning] {len(texts)} samples from {DATA_FILE}"
+          f"{' + ' + FEEDBACK_FILE if os.path.exists(FEEDBACK_FILE) else ''}")
+    scores = ScoreCache(args.cache).build(texts, labels, invalidate=set(args.invalidate))
+
+    weights = weight_grid(args.step)
+    block = np.round(np.arange(0.20, 0.901, 0.025), 3)
+    allow = np.round(np.arange(0.05, 0.601, 0.025), 3)
+    result = sweep(scores, labels, weights, block, allow)
+
+    current = sweep(scores, labels, np.array([WEIGHTS], dtype=np.float32),
+                    np.array([BLOCK_THRESHOLD]), np.array([ALLOW_THRESHOLD]))
+    print("=" * 78)
+    print(f"Current  w={WEIGHTS} block={BLOCK_THRESHOLD} allow={ALLOW_THRESHOLD}: "
+          f"P={current['precision'][0, 0]:.3f} R={current['recall'][0, 0]:.3f} "
+          f"F1={current['f1'][0, 0]:.3f} review={current['review'][0, 0, 0]:.3f} "
+          f"allow-leak={current['allow_leak'][0, 0]:.3f}")
+    print(f"Swept {len(weights)} weight vectors × {len(block)} block × {len(allow)} allow cutoffs")
+    print("-" * 78)
+    rows = best_configs(result, weights, block, allow, args.max_review,
+                        args.max_allow_leak, args.top)
+    for row in rows:
+        print(f"w={row['weights']}  block={row['block']:.3f} allow={row['allow']:.3f}  "
+              f"P={row['precision']:.3f} R={row['recall']:.3f} F1={row['f1']:.3f} "
+              f"review={row['review']:.3f} allow-leak={row['allow_leak']:.3f}")
+    if not rows:
+        print("No config meets --max-review and --max-allow-leak; relax one of them.")
+
+
+if __name__ == "__main__":
+    main()